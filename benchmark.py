@@ -0,0 +1,180 @@
+import argparse
+import json
+import platform
+import sys
+import timeit
+
+import pandas as pd
+import plotly.io as pio
+
+import main
+from cache import serialize
+from main import (df, groupby, get_proportion, satis_level, len_satis_level, date_nb_satis, static_graphs,
+                  figure_cache, cube_groupby, bitmap_counts, px_measure_bar, measure_patch, px_gender_bar, gender_bar)
+
+
+# Previous pandas versions of groupby() and get_proportion(), for comparison
+def pandas_groupby(data, col_1, col_2):
+    count = data.groupby([col_1, col_2], observed=False).size()
+    total = count.groupby(level=0, observed=True).transform('sum')
+
+    return pd.DataFrame({
+        'percentage': round(100 * count / total.where(total > 0), 2),
+        'count': count
+    }).reset_index()
+
+
+def pandas_get_proportion(data, col_name):
+    counts = data[col_name].value_counts()
+
+    DataFrame = pd.DataFrame({
+        'count': counts,
+        'percentage': round(counts / counts.sum() * 100, 2)
+    }, index=counts.index)
+
+    return DataFrame.sort_values(by='percentage', ascending=True)
+
+
+# Participants resampled scale times (same columns and types), the csv itself at scale 1
+def synthetic(data, scale):
+    if scale == 1:
+        return data
+
+    return data.sample(n=len(data) * scale, replace=True, random_state=0, ignore_index=True)
+
+
+# Points the callbacks of main.py (rows, aggregate cube, bitmaps) at data
+def use_data(data):
+    main.df = data
+    main.cube = {col: main.build_cube(data, col) for col in main.cube}
+    main.bitmaps = {col: main.build_bitmaps(data, col) for col in main.bitmap_columns}
+    main._filter_bitmap.cache_clear()
+
+
+# Best of repeat runs, in ms
+def best_time(func, *args, repeat=5):
+    return min(timeit.repeat(lambda: func(*args), number=1, repeat=repeat)) * 1000
+
+
+# (name, function, arguments after the data)
+data_cases = [
+    ('groupby(gender, satis_2)', groupby, ('gender', 'satis_2')),
+    ('groupby(field_of_study, gender)', groupby, ('field_of_study', 'gender')),
+    ('groupby(ethnic_group, gender)', groupby, ('ethnic_group', 'gender')),
+    ('pandas_groupby(gender, satis_2)', pandas_groupby, ('gender', 'satis_2')),
+    ('pandas_groupby(field_of_study, gender)', pandas_groupby, ('field_of_study', 'gender')),
+    ('pandas_groupby(ethnic_group, gender)', pandas_groupby, ('ethnic_group', 'gender')),
+    ('get_proportion(gender)', get_proportion, ('gender',)),
+    ('get_proportion(field_of_study)', get_proportion, ('field_of_study',)),
+    ('pandas_get_proportion(gender)', pandas_get_proportion, ('gender',)),
+    ('pandas_get_proportion(field_of_study)', pandas_get_proportion, ('field_of_study',)),
+    ('satis_level(field_of_study, satis_2)', satis_level, ('field_of_study', 'satis_2')),
+    ('len_satis_level(field_of_study, length)', len_satis_level, ('field_of_study', 'length')),
+    ('date_nb_satis(field_of_study, speed_date_nb)', date_nb_satis, ('field_of_study', 'speed_date_nb'))
+] + [
+    # study_func and duration_func, as the static graphs call them
+    (f'{func.__name__}({graph_id})', func, (col, col2, tick_size, tick_angle))
+    for graph_id, (func, col, col2, tick_size, tick_angle, height) in static_graphs.items()
+]
+
+# (name, callback (cache name), inputs) : the callback bodies, serialization included, without the figure cache
+callback_cases = [
+    ('hist(All, All)', 'hist', ('All', 'All')),
+    ('hist(Law, Caucasian)', 'hist', ('Law', 'Caucasian')),
+    ('gender_bar(All, All)', 'gender_bar', ('All', 'All')),
+    ('gender_bar(Law, Caucasian)', 'gender_bar', ('Law', 'Caucasian')),
+    ('field_study(18-39)', 'field_study', ([18, 39],)),
+    ('ethnic_bar(18-39)', 'ethnic_bar', ([18, 39],)),
+    ('satis_bar(18-39, All, All)', 'satis_bar', ([18, 39], 'All', 'All')),
+    ('satis_bar(20-30, Caucasian, Law)', 'satis_bar', ([20, 30], 'Caucasian', 'Law')),
+    ('duration_bar(18-39, All, All)', 'duration_bar', ([18, 39], 'All', 'All')),
+    ('ndate_bar(18-39, All, All)', 'ndate_bar', ([18, 39], 'All', 'All'))
+]
+
+
+def callback_body(name, *args):
+    return serialize(figure_cache.functions[name](*args))
+
+
+# (name, plotly express figure, skeleton based version the callbacks run (full figure or patch), arguments),
+# serialized as the callbacks return them
+figure_cases = [
+    ('satis_2 bar', px_measure_bar, measure_patch, (cube_groupby('gender', 'satis_2'), 'satis_2', None, 15)),
+    ('length bar', px_measure_bar, measure_patch, (cube_groupby('gender', 'length'), 'length', None, 15)),
+    ('gender bar', px_gender_bar, gender_bar, (get_proportion(None, 'gender', counts=bitmap_counts('gender')),))
+]
+
+
+def serialized(func, *args):
+    return pio.to_json(func(*args), validate=False)
+
+
+# Times (ms) by case name, '<scale>x <case>' for the cases run on the data
+def run(scales, repeat=5):
+    results = {}
+
+    for name, reference, skeleton_func, args in figure_cases:
+        results[f'{name} plotly express'] = best_time(serialized, reference, *args, repeat=repeat)
+        results[f'{name} skeleton'] = best_time(serialized, skeleton_func, *args, repeat=repeat)
+
+    for scale in scales:
+        data = synthetic(df, scale)
+        use_data(data)
+
+        for name, func, args in data_cases:
+            results[f'{scale}x {name}'] = best_time(func, data, *args, repeat=repeat)
+
+        for name, callback, args in callback_cases:
+            results[f'{scale}x {name}'] = best_time(callback_body, callback, *args, repeat=repeat)
+
+    use_data(df)
+
+    return results
+
+
+# Cases slower than the baseline by more than threshold (.2 : 20 %) : (name, baseline, time)
+def regressions(baseline, results, threshold):
+    return [(name, baseline[name], time) for name, time in results.items()
+            if name in baseline and time > baseline[name] * (1 + threshold)]
+
+
+if __name__ == '__main__':
+    # e.g. python benchmark.py --scales 1 10 --output after.json --compare before.json
+    parser = argparse.ArgumentParser(description='Benchmark of the functions and callbacks of main.py')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100, 1000],
+                        help='participant count multiples (1 is the csv itself)')
+    parser.add_argument('--repeat', type=int, default=5, help='runs of each case, the best one is kept')
+    parser.add_argument('--output', help='JSON file for the results')
+    parser.add_argument('--compare', help='JSON results of a previous run, to flag regressions')
+    parser.add_argument('--threshold', type=float, default=.2, help='slowdown flagged as a regression')
+    args = parser.parse_args()
+
+    results = run(args.scales, repeat=args.repeat)
+    baseline = {}
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+
+    for name, time in results.items():
+        if name in baseline:
+            print(f'{name}: {time:.2f} ms (baseline {baseline[name]:.2f} ms, x{time / baseline[name]:.2f})')
+        else:
+            print(f'{name}: {time:.2f} ms')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'pandas': pd.__version__,
+                'scales': args.scales,
+                'results': results
+            }, f, indent=2)
+
+    slower = regressions(baseline, results, args.threshold)
+
+    for name, before, time in slower:
+        print(f'REGRESSION {name}: {before:.2f} ms -> {time:.2f} ms (x{time / before:.2f})')
+
+    # Non zero exit status when a case regressed (CI)
+    sys.exit(1 if slower else 0)
@@ -0,0 +1,380 @@
+import functools
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import warnings
+from collections import OrderedDict
+
+import plotly.io as pio
+
+from metrics import timed, mark_cache
+
+# Optional shared backends : without them the figures are only cached in each process
+try:
+    import diskcache
+except ImportError:
+    diskcache = None
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+# Cache key of a call : function name and inputs (lists become tuples)
+def call_key(name, args):
+    return (name,) + tuple(tuple(arg) if isinstance(arg, list) else arg for arg in args)
+
+
+# Figures or figure dictionaries as JSON
+@timed('serialization')
+def serialize(figure):
+    return pio.to_json(figure, validate=False)
+
+
+# Computation in progress for a key, shared by the requests that wait for it
+class Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+# Shared cache in a local directory, safe across processes (diskcache) : entries expire after ttl
+# seconds, the least recently used ones are evicted above size_limit bytes. set() and ping() tell
+# whether the write went through
+class DiskCache:
+    def __init__(self, directory, ttl=None, size_limit=2 ** 30):
+        self.ttl = ttl
+        # Bounded in bytes, not in entries
+        self.capacity = None
+        self._cache = diskcache.Cache(directory, size_limit=size_limit,
+                                      eviction_policy='least-recently-used')
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, value):
+        try:
+            return self._cache.set(key, value, expire=self.ttl)
+        except (OSError, sqlite3.Error):
+            return False
+
+    # Write and read back round-trip
+    def ping(self):
+        return self.set('ping', 'ok') and self.get('ping') == 'ok'
+
+    def clear(self):
+        self._cache.clear()
+
+
+# Shared cache in a Redis compatible store (client with the redis-py interface) : entries expire after
+# ttl seconds, the oldest ones are evicted above max_entries (keys indexed by write time in a sorted set).
+# The store being unreachable counts as a miss, set() and ping() then return False
+class RedisCache:
+    def __init__(self, client, ttl=None, max_entries=10000, prefix='figures:'):
+        self.client = client
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # Entries kept before the oldest ones are evicted
+        self.capacity = max_entries
+        self.prefix = prefix
+        self.index = f'{prefix}index'
+
+    def get(self, key):
+        try:
+            value = self.client.get(self.prefix + key)
+        except redis.RedisError:
+            return None
+
+        return None if value is None else value.decode()
+
+    def set(self, key, value):
+        now = time.time()
+
+        try:
+            pipeline = self.client.pipeline()
+            pipeline.set(self.prefix + key, value, ex=self.ttl)
+            pipeline.zadd(self.index, {key: now})
+            if self.ttl is not None:
+                pipeline.zremrangebyscore(self.index, 0, now - self.ttl)
+            pipeline.zcard(self.index)
+            size = pipeline.execute()[-1]
+
+            if size > self.max_entries:
+                oldest = self.client.zpopmin(self.index, size - self.max_entries)
+                self.client.delete(*[self.prefix + key.decode() for key, _ in oldest])
+        except redis.RedisError:
+            return False
+
+        return True
+
+    # Write and read back round-trip (out of the index, expires after a minute)
+    def ping(self):
+        try:
+            self.client.set(f'{self.prefix}ping', 'ok', ex=60)
+            return self.client.get(f'{self.prefix}ping') == b'ok'
+        except redis.RedisError:
+            return False
+
+    def clear(self):
+        keys = [self.prefix + key.decode() for key in self.client.zrange(self.index, 0, -1)]
+        self.client.delete(self.index, *keys)
+
+
+# Shared backend from its url : redis://host:port/db (or rediss://, unix://), otherwise a directory.
+# max_entries bounds the Redis backend, the directory one is bounded by its size
+def shared_cache(url, ttl=None, max_entries=10000):
+    if not url:
+        return None
+
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        if redis is None:
+            warnings.warn('redis is not installed, figures are cached per process')
+            return None
+
+        return RedisCache(redis.Redis.from_url(url), ttl=ttl, max_entries=max_entries)
+
+    if diskcache is None:
+        warnings.warn('diskcache is not installed, figures are cached per process')
+        return None
+
+    return DiskCache(url, ttl=ttl)
+
+
+# Removes a file that may not exist (temporary file of a failed write)
+def remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+# JSON value of build(), kept in directory as name.version.json : the next processes read it back instead
+# of building it again, until the version changes. Unreadable files are rebuilt, files of other versions removed
+def persisted(directory, name, version, build):
+    path = os.path.join(directory, f'{name}.{version}.json')
+
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except Exception:
+        pass
+
+    value = build()
+
+    # Written under a temporary name first as several workers may start together
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+
+    try:
+        os.makedirs(directory, exist_ok=True)
+        with open(tmp_path, 'w') as f:
+            json.dump(value, f)
+        os.replace(tmp_path, path)
+
+        for file in os.listdir(directory):
+            if file.startswith(f'{name}.') and file.endswith('.json') and file != os.path.basename(path):
+                os.remove(os.path.join(directory, file))
+    except OSError:
+        remove_file(tmp_path)
+
+    return value
+
+
+# Bounded figure cache : keeps the serialized figures (JSON) of the last maxsize keys.
+# With a shared backend (DiskCache, RedisCache), figures computed by one process are reused by
+# the others, under keys that include the namespace (fingerprint of the data)
+class LRUCache:
+    def __init__(self, maxsize=256, shared=None, namespace=''):
+        self.maxsize = maxsize
+        self.shared = shared
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+        # Misses found in the shared backend
+        self.shared_hits = 0
+        # Requests served by the computation of a concurrent identical request
+        self.coalesced = 0
+        self._data = OrderedDict()
+        self._in_flight = {}
+        self.functions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+
+            # Evict the least recently used figures
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+            self.shared_hits = 0
+            self.coalesced = 0
+
+    def info(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'shared_hits': self.shared_hits,
+            'coalesced': self.coalesced,
+            'size': len(self._data),
+            'maxsize': self.maxsize
+        }
+
+    # Single flight : the first request for a missing key computes it, identical requests arriving
+    # meanwhile wait for that result (or its error) instead of computing it again. The result (hit,
+    # coalesced, shared_hit or miss) is marked on the current callback request
+    def compute(self, key, func):
+        with self._lock:
+            if key in self._data:
+                mark_cache('hit')
+                return self._data[key]
+
+            flight = self._in_flight.get(key)
+            leader = flight is None
+
+            if leader:
+                flight = self._in_flight[key] = Flight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            mark_cache('coalesced')
+            flight.done.wait()
+
+            if flight.error is not None:
+                raise flight.error
+
+            return flight.value
+
+        try:
+            flight.value = self.compute_shared(key, func)
+            self.set(key, flight.value)
+        except Exception as error:
+            flight.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            flight.done.set()
+
+        return flight.value
+
+    # Key in the shared backend : digest of the namespace and the key
+    def shared_key(self, key):
+        return hashlib.sha1(json.dumps([self.namespace, key]).encode()).hexdigest()
+
+    # Value from the shared backend, or computed then shared
+    def compute_shared(self, key, func):
+        if self.shared is None:
+            mark_cache('miss')
+            return func()
+
+        shared_key = self.shared_key(key)
+        value = self.shared.get(shared_key)
+
+        if value is not None:
+            with self._lock:
+                self.shared_hits += 1
+            mark_cache('shared_hit')
+            return value
+
+        mark_cache('miss')
+        value = func()
+        self.shared.set(shared_key, value)
+
+        return value
+
+    # Snapshot of the cached figures (gzip JSON), valid for the given fingerprint
+    def save(self, path, fingerprint):
+        with self._lock:
+            entries = list(self._data.items())
+
+        # Processes that served no figure (scripts importing main) keep the previous snapshot
+        if not entries:
+            return
+
+        # Written under a temporary name first as several workers may stop together
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+
+        try:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            with gzip.open(tmp_path, 'wt') as f:
+                json.dump({'fingerprint': fingerprint, 'entries': entries}, f)
+            os.replace(tmp_path, path)
+        except OSError:
+            remove_file(tmp_path)
+
+    # Figures of a snapshot taken with the same fingerprint (number of figures restored). It runs
+    # when the workers start : an unreadable snapshot (truncated, corrupt, other format) is ignored
+    def load(self, path, fingerprint):
+        try:
+            with gzip.open(path, 'rt') as f:
+                snapshot = json.load(f)
+
+            if snapshot.get('fingerprint') != fingerprint:
+                return 0
+
+            # JSON turned the key tuples into lists
+            entries = [(call_key(key[0], key[1:]), value) for key, value in snapshot['entries']]
+        except Exception:
+            return 0
+
+        for key, value in entries:
+            self.set(key, value)
+
+        return len(entries)
+
+    # Entry computed elsewhere (warm-up), also written to the shared backend.
+    # Whether the shared backend (if any) took the value
+    def store(self, key, value):
+        self.set(key, value)
+
+        if self.shared is not None:
+            return self.shared.set(self.shared_key(key), value)
+
+        return True
+
+    # Decorator for figure callbacks : inputs (lists become tuples) are the cache key.
+    # The undecorated functions are kept by name (to render figures out of a request)
+    def memoize(self, name):
+        def decorator(func):
+            self.functions[name] = func
+            # Time of the callback body itself (figure building), the functions it calls time their phases
+            body = timed('figure')(func)
+
+            @functools.wraps(func)
+            def wrapper(*args):
+                key = call_key(name, args)
+                value = self.get(key)
+
+                if value is None:
+                    value = self.compute(key, lambda: serialize(body(*args)))
+                else:
+                    mark_cache('hit')
+
+                return json.loads(value)
+
+            return wrapper
+
+        return decorator
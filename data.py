@@ -0,0 +1,196 @@
+import hashlib
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Optional : without pyarrow the csv files are parsed on every start
+try:
+    import pyarrow.feather as feather
+except ImportError:
+    feather = None
+
+############# Data ###############
+
+# To sort by satisfaction level
+satis = ['Very satisfied', 'Satisfied', 'Neutral', 'Not satisfied', 'Not satisfied at all', 'Unknown']
+
+# To sort by date duration
+length = ['Just right', 'Too much', 'Too little', 'Unknown']
+
+# To sort by number of date sentiment
+ndate = ['Just right', 'Too few', 'Too many',  'Unknown']
+
+# Compact column types : small integers (nullable when values are missing) and categories for strings.
+# Ids and row numbers grow with the exports (multi-wave ones go past the int16 range) : int32
+participants_schema = {
+    'Unnamed: 0': 'int32',
+    'iid': 'int32',
+    'age': 'int8',
+    'gender': 'category',
+    'ethnic_group': 'category',
+    'goal': 'category',
+    # Kept as Yes/No, the histogram hover shows it
+    'match': 'category'
+}
+
+dates_schema = {
+    'Unnamed: 0': 'int32',
+    'iid': 'Int32',
+    'age': 'Int8',
+    'gender': 'category',
+    'field_cd': 'Int8',
+    'race': 'Int8',
+    'goal': 'Int8',
+    'match': 'boolean',
+    'satis_2': 'Int8',
+    'length': 'Int8',
+    'numdat_2': 'Int8'
+}
+
+# Typed copies of the csv files (Feather), named after the csv content hash
+cache_dir = '.data_cache'
+
+
+# Integer casts wrap around silently (40000 as int16 is -25536) : values out of the range of the
+# schema type are an error
+def check_range(values, col, dtype):
+    info = np.iinfo(dtype.lower())
+    low, high = values.min(), values.max()
+
+    if pd.notna(low) and (low < info.min or high > info.max):
+        raise ValueError(f'{col} values ({low} to {high}) do not fit in {dtype}, widen it in the schema')
+
+
+def apply_schema(df, schema):
+    for col, dtype in schema.items():
+        if dtype.lower().startswith(('int', 'uint')):
+            check_range(df[col], col, dtype)
+
+        if dtype == 'boolean':
+            df[col] = df[col].map({'Yes': True, 'No': False}).astype(dtype)
+        else:
+            df[col] = df[col].astype(dtype)
+
+    return df
+
+
+# Participants table : compact types and ordered categories
+def prepare_participants(df):
+    df = apply_schema(df, participants_schema)
+    df['satis_2'] = pd.Categorical(df['satis_2'], categories=satis, ordered=True)
+
+    # To sort by field of study
+    study = df['field_of_study'].value_counts().index.tolist()
+    df['field_of_study'] = pd.Categorical(df['field_of_study'], categories=study, ordered=True)
+
+    df['length'] = pd.Categorical(df['length'], categories=length, ordered=True)
+    df['speed_date_nb'] = pd.Categorical(df['speed_date_nb'], categories=ndate, ordered=True)
+
+    return df
+
+
+def prepare_dates(df):
+    return apply_schema(df, dates_schema)
+
+
+# Content hash of a file
+def file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()[:16]
+
+
+# Version of the preparation code (this file)
+code_version = file_digest(os.path.abspath(__file__))
+
+
+# This will return the csv as a typed dataframe, from its binary cache when neither the csv nor
+# the preparation code changed
+def read_cached(path, prepare=None):
+    prepare = prepare or (lambda df: df)
+
+    if feather is None:
+        return prepare(pd.read_csv(path))
+
+    digest = file_digest(path)
+
+    # Named after the csv content and the preparation code (schemas, categories) that typed it
+    name = os.path.splitext(os.path.basename(path))[0]
+    cache_path = os.path.join(cache_dir, f'{name}.{digest}.{code_version}.feather')
+
+    # Types (ordered categories included) are stored in the file. to_pandas() still copies the
+    # columns into pandas memory : the map only spares an intermediate read buffer
+    if os.path.exists(cache_path):
+        return feather.read_table(cache_path, memory_map=True).to_pandas()
+
+    df = prepare(pd.read_csv(path))
+
+    # Written under a temporary name first as several workers may start together
+    tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        feather.write_feather(df, tmp_path, compression='uncompressed')
+        os.replace(tmp_path, cache_path)
+
+        # Copies of a previous version of the csv or of the preparation code
+        for file in os.listdir(cache_dir):
+            if file.startswith(f'{name}.') and file.endswith('.feather') and file != os.path.basename(cache_path):
+                os.remove(os.path.join(cache_dir, file))
+    except OSError:
+        # Partial copy of a failed write
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+    return df
+
+
+# Datasets by name : (csv path, preparation)
+datasets = {
+    'participants': ('subdata_speed_dating.csv', prepare_participants),
+    # Per date table, kept for the notebook analysis
+    'dates': ('data_speed_dating.csv', prepare_dates)
+}
+
+loaded = {}
+_load_lock = threading.Lock()
+
+
+# Datasets are only read on first access, unused ones cost nothing
+def load(name):
+    with _load_lock:
+        if name not in loaded:
+            path, prepare = datasets[name]
+            loaded[name] = read_cached(path, prepare)
+
+        return loaded[name]
+
+
+# Content hash of a dataset csv, changes when the data does
+def fingerprint(name):
+    return file_digest(datasets[name][0])
+
+
+# Memory footprint (bytes) of the loaded datasets
+def memory_usage():
+    return {name: int(data.memory_usage(deep=True).sum()) for name, data in loaded.items()}
+
+
+# Memory (bytes) of each dataset with the pandas default types, then with the compact schema
+def memory_report():
+    report = {}
+    for name, (path, prepare) in datasets.items():
+        report[name] = {
+            'before': int(pd.read_csv(path).memory_usage(deep=True).sum()),
+            'after': int(prepare(pd.read_csv(path)).memory_usage(deep=True).sum())
+        }
+
+    return report
+
+
+if __name__ == '__main__':
+    for name, usage in memory_report().items():
+        print(f"{name}: {usage['before'] / 1e6:.2f} MB -> {usage['after'] / 1e6:.2f} MB")
@@ -1,128 +1,316 @@
+import atexit
+import functools
+import hashlib
+import json
+import os
+
+import numpy as np
 import pandas as pd
+import plotly
 import plotly.express as px
+import plotly.graph_objects as go
 import dash_bootstrap_components as dbc
-from dash import Dash, dcc, html, Input, Output
+from dash import Dash, dcc, html, Input, Output, State, Patch
 import dash_daq as daq
+from flask import Response, abort
 
-############# Data ###############
+from cache import LRUCache, shared_cache, persisted, serialize
+from metrics import timed, instrument
+from profiling import enable_profiling
+from data import satis, length, ndate, load, fingerprint, file_digest, cache_dir
 
-dff = pd.read_csv("data_speed_dating.csv")
-df = pd.read_csv("subdata_speed_dating.csv")
-df['age'] = df['age'].astype(int)
+############# Data ###############
 
-# To sort by satisfaction level
-satis = ['Very satisfied', 'Satisfied', 'Neutral', 'Not satisfied', 'Not satisfied at all', 'Unknown']
-df['satis_2'] = pd.Categorical(df['satis_2'], categories=satis, ordered=True)
+df = load('participants')
 
 # To sort by field of study
-study = df['field_of_study'].value_counts().index.tolist()
-df['field_of_study'] = pd.Categorical(df['field_of_study'], categories=study, ordered=True)
-
-# To sort by date duration
-length = ['Just right', 'Too much', 'Too little', 'Unknown']
-df['length'] = pd.Categorical(df['length'], categories=length, ordered=True)
-
-# To sort by number of date sentiment
-ndate = ['Just right', 'Too few', 'Too many',  'Unknown']
-df['speed_date_nb'] = pd.Categorical(df['speed_date_nb'], categories=ndate, ordered=True)
+study = df['field_of_study'].cat.categories.tolist()
 
 # Age slider
 age = sorted(df['age'].unique())
 numbers = [i for i in range(18, 56)]
 wrong_age = [i for i in numbers if i not in age] + [i for i in numbers if i > 39]
 
+# Aggregate cube : participant counts for every combination of the callbacks filters
+cube_axes = ['field_of_study', 'ethnic_group', 'age', 'gender']
+# Sorting categories, all their values are kept in the charts (even with a count of 0)
+cube_categories = ['field_of_study', 'satis_2', 'length', 'speed_date_nb']
+cube_levels = {
+    'field_of_study': study,
+    'ethnic_group': sorted(df['ethnic_group'].unique()),
+    'age': age,
+    'gender': sorted(df['gender'].unique()),
+    'satis_2': satis,
+    'length': length,
+    'speed_date_nb': ndate
+}
+
 
 ############ Functions ###########
 
+# Integer codes of a column (-1 for missing values) and the values they stand for
+# Categories keep their order, other values are sorted or in order of appearance
+def column_codes(column, sort=True):
+    if column.dtype == 'category':
+        return column.cat.codes.to_numpy(), pd.CategoricalIndex(column.cat.categories, dtype=column.dtype)
+
+    return pd.factorize(column, sort=sort)
+
+
+# data[col].value_counts() with np.bincount on the column codes
+def value_counts(data, col):
+    codes, levels = column_codes(data[col], sort=False)
+
+    # Codes are shifted by one : missing values (-1) fall in the first bin, which is dropped
+    counts = np.bincount(codes + 1, minlength=len(levels) + 1)[1:]
+    counts = pd.Series(counts, index=levels, name=col)
+
+    return counts.sort_values(ascending=False)
+
+
+# Counts of every (col_1, col_2) pair : np.bincount on the combined codes, as a matrix
+def count_matrix(data, col_1, col_2):
+    codes_1, levels_1 = column_codes(data[col_1])
+    codes_2, levels_2 = column_codes(data[col_2])
+
+    # Rows with a missing value are not counted
+    valid = (codes_1 >= 0) & (codes_2 >= 0)
+    pairs = codes_1[valid].astype('int64') * len(levels_2) + codes_2[valid]
+    counts = np.bincount(pairs, minlength=len(levels_1) * len(levels_2))
+
+    return counts.reshape(len(levels_1), len(levels_2)), levels_1, levels_2
+
+
+# groupby() dataframe from a count matrix, with the pandas rules : every category is kept
+# (count of 0), other columns only keep their observed values
+def count_frame(counts, col_1, levels_1, col_2, levels_2):
+    categorical_1 = isinstance(levels_1, pd.CategoricalIndex)
+    categorical_2 = isinstance(levels_2, pd.CategoricalIndex)
+
+    if not categorical_1:
+        observed = counts.sum(axis=1) > 0
+        counts, levels_1 = counts[observed], levels_1[observed]
+    if not categorical_2:
+        observed = counts.sum(axis=0) > 0
+        counts, levels_2 = counts[:, observed], levels_2[observed]
+
+    # Percentage is left undefined (NaN) for empty groups
+    total = counts.sum(axis=1, keepdims=True)
+    percentage = np.round(np.divide(100 * counts, total, out=np.full(counts.shape, np.nan), where=total > 0), 2)
+
+    groupby = pd.DataFrame({
+        col_1: levels_1.take(np.repeat(np.arange(len(levels_1)), len(levels_2))),
+        col_2: levels_2.take(np.tile(np.arange(len(levels_2)), len(levels_1))),
+        'percentage': percentage.ravel(),
+        'count': counts.ravel()
+    })
+
+    # Without any category, only the observed pairs are returned
+    if not categorical_1 and not categorical_2:
+        groupby = groupby[groupby['count'] > 0].reset_index(drop=True)
+
+    return groupby
+
+
 # This will return a dataframe with value counts and percentage from a column
-def get_proportion(data, col_name):
-    count = data[col_name].value_counts()
-    percentage = round((data[col_name].value_counts(normalize=True) * 100), 2)
-    index = data[col_name].value_counts().index
-
-    dic = {
-        'count': count,
-        'percentage': percentage
-    }
+# Counts can also be given precomputed (e.g. bitmap_counts)
+@timed('aggregate')
+def get_proportion(data, col_name, counts=None):
+    if counts is None:
+        counts = value_counts(data, col_name)
 
-    DataFrame = pd.DataFrame(dic,
-                             index=index)
+    DataFrame = pd.DataFrame({
+        'count': counts,
+        'percentage': round(counts / counts.sum() * 100, 2)
+    }, index=counts.index)
 
     return DataFrame.sort_values(by='percentage', ascending=True)
 
 
 # Function that will return percentage and count
+@timed('aggregate')
 def groupby(data, col_1, col_2):
-    groupby = pd.DataFrame(data.groupby([col_1, col_2]).agg({col_2: "count"})).groupby(level=0).apply(
-        lambda x: round(100 * x / x.sum(), 2))
-    groupby = groupby.rename(columns={col_2: 'percentage'}).reset_index()
-    groupby['count'] = data.groupby([col_1, col_2])[col_2].agg(['count']).values
+    counts, levels_1, levels_2 = count_matrix(data, col_1, col_2)
+
+    return count_frame(counts, col_1, levels_1, col_2, levels_2)
 
-    return groupby
+
+# Sort a groupby dataframe by the position of col values in levels (other values last)
+def sort_levels(groupby_data, col, levels):
+    codes = pd.Categorical(groupby_data[col], categories=levels).codes
+    groupby_data['index'] = (np.where(codes == -1, len(levels) - 1, codes) + 1).astype('int64')
+
+    return groupby_data.sort_values(by='index')
 
 
 def satis_level(data, col_1, col_2):
     # Using groupby function for count and proportion
-    groupby_data = groupby(data, col_1, col_2)
-
-    index = []
-    # Get a list of number to reorder level of satisfaction level
-    for i in range(len(groupby_data)):
-        if groupby_data[col_2][i] == 'Very satisfied':
-            index.append(1)
-        elif groupby_data[col_2][i] == 'Satisfied':
-            index.append(2)
-        elif groupby_data[col_2][i] == 'Neutral':
-            index.append(3)
-        elif groupby_data[col_2][i] == 'Not satisfied':
-            index.append(4)
-        elif groupby_data[col_2][i] == 'Not satisfied at all':
-            index.append(5)
-        else:
-            index.append(6)
-
-    groupby_data['index'] = index
-    return groupby_data.sort_values(by='index')
+    return sort_levels(groupby(data, col_1, col_2), col_2, satis)
 
 
 def len_satis_level(data, col_1, col_2):
-    groupby_data = groupby(data, col_1, col_2)
+    return sort_levels(groupby(data, col_1, col_2), col_2, ['Just right', 'Too little', 'Too much', 'Unknown'])
 
-    index = []
 
-    for i in range(len(groupby_data)):
-        if groupby_data[col_2][i] == 'Just right':
-            index.append(1)
-        elif groupby_data[col_2][i] == 'Too little':
-            index.append(2)
-        elif groupby_data[col_2][i] == 'Too much':
-            index.append(3)
-        else:
-            index.append(4)
+def date_nb_satis(data, col_1, col_2):
+    return sort_levels(groupby(data, col_1, col_2), col_2, ndate)
 
-    groupby_data['index'] = index
 
-    return groupby_data.sort_values(by='index')
+# Keep the groupby rows whose col group has more than min_count participants in data_frame
+# Exact membership : names are neither regex patterns nor matched as substrings
+def filter_min_count(data, data_frame, col, min_count=5):
+    counts = data_frame[col].value_counts()
 
+    return data[data[col].isin(counts[counts > min_count].index)]
 
-def date_nb_satis(data, col_1, col_2):
-    groupby_data = groupby(data, col_1, col_2)
 
-    index = []
+# This will return an array of counts with one axis per cube_axes column, plus one for col
+# Counts are cumulated along the (sorted) age axis, starting from 0
+def build_cube(data, col):
+    axes = cube_axes + [col]
+    cube = np.zeros([len(cube_levels[c]) for c in axes], dtype='int64')
+    codes = tuple(pd.Categorical(data[c], categories=cube_levels[c]).codes for c in axes)
+    np.add.at(cube, codes, 1)
 
-    for i in range(len(groupby_data)):
-        if groupby_data[col_2][i] == 'Just right':
-            index.append(1)
-        elif groupby_data[col_2][i] == 'Too few':
-            index.append(2)
-        elif groupby_data[col_2][i] == 'Too many':
-            index.append(3)
-        else:
-            index.append(4)
+    return np.concatenate([np.zeros_like(cube[:, :, :1]), cube.cumsum(axis=2)], axis=2)
 
-    groupby_data['index'] = index
 
-    return groupby_data.sort_values(by='index')
+cube = {col: build_cube(df, col) for col in ['satis_2', 'length', 'speed_date_nb']}
+
+
+# Cube slice of a col value along axis. Unknown values (not in the data, None for a cleared
+# dropdown) match no participant : a slice of zeros, as value_bitmap() does for the rows.
+# With keep (col is also grouped by), the axis keeps every col level, the others at 0
+def level_take(data, col, value, axis, keep=False):
+    if value not in cube_levels[col]:
+        return np.zeros_like(data) if keep else np.zeros_like(data.take([0], axis=axis))
+
+    position = cube_levels[col].index(value)
+
+    if not keep:
+        return data.take([position], axis=axis)
+
+    mask = np.zeros(data.shape[axis], dtype=data.dtype)
+    mask[position] = 1
+
+    return data * mask.reshape([-1 if i == axis else 1 for i in range(data.ndim)])
+
+
+# Sum the cube slices matching the filters, keeping only the col axes (in that order)
+# An age axis only holds the ages of the range (all the cube ages without age_range)
+def cube_sum(cols, study='All', ethnic='All', age_range=None):
+    # Any cube holds the participants counts, the measure axis is summed if unused
+    measure = next((c for c in cols if c in cube), 'satis_2')
+    data = cube[measure]
+
+    # Age range positions by binary search, counts are the difference of the cumulated counts
+    low, high = 0, len(cube_levels['age'])
+    if age_range is not None:
+        low = np.searchsorted(cube_levels['age'], age_range[0], side='left')
+        high = max(low, np.searchsorted(cube_levels['age'], age_range[1], side='right'))
+
+    if 'age' in cols:
+        axes = cube_axes + [measure]
+        data = np.diff(data[:, :, low:high + 1], axis=2)
+    else:
+        axes = ['field_of_study', 'ethnic_group', 'gender', measure]
+        data = data[:, :, high] - data[:, :, low]
+
+    if study != 'All':
+        data = level_take(data, 'field_of_study', study, axis=0, keep='field_of_study' in cols)
+
+    if ethnic != 'All':
+        data = level_take(data, 'ethnic_group', ethnic, axis=1, keep='ethnic_group' in cols)
+
+    positions = [axes.index(c) for c in cols]
+    data = data.sum(axis=tuple(i for i in range(len(axes)) if i not in positions))
+
+    # Summed array keeps the cube axes order
+    return data.transpose(np.argsort(np.argsort(positions)))
+
+
+# Cube version of groupby(), without filtering and regrouping rows
+@timed('aggregate')
+def cube_groupby(col_1, col_2, study='All', ethnic='All', age_range=None):
+    counts = cube_sum([col_1, col_2], study, ethnic, age_range)
+
+    return count_frame(counts, col_1, cube_index(col_1), col_2, cube_index(col_2))
+
+
+# Cube levels of col, as categories for the sorting categories (all of their values are kept)
+def cube_index(col):
+    if col in cube_categories:
+        return pd.CategoricalIndex(cube_levels[col], dtype=df[col].dtype)
+
+    return pd.Index(cube_levels[col], dtype=object)
+
+
+# Bitmap indexes : one packed bit array per value of the filter columns (bit i is row i of df),
+# stacked in an array of shape (values, bytes)
+bitmap_columns = ['field_of_study', 'ethnic_group', 'gender', 'age']
+
+
+def build_bitmaps(data, col):
+    codes = pd.Categorical(data[col], categories=cube_levels[col]).codes
+
+    return np.packbits(codes[np.newaxis, :] == np.arange(len(cube_levels[col]))[:, np.newaxis], axis=1)
+
+
+bitmaps = {col: build_bitmaps(df, col) for col in bitmap_columns}
+
+# Number of set bits of every byte value
+popcount = np.array([bin(i).count('1') for i in range(256)], dtype='int64')
+
+
+# Filters are an AND of the bitmaps, every (study, ethnic, age_range) state is cached
+@functools.lru_cache(maxsize=1024)
+def _filter_bitmap(study, ethnic, age_range):
+    bitmap = np.packbits(np.ones(len(df), dtype=bool))
+
+    if study != 'All':
+        bitmap = bitmap & value_bitmap('field_of_study', study)
+
+    if ethnic != 'All':
+        bitmap = bitmap & value_bitmap('ethnic_group', ethnic)
+
+    # Ages are sorted : the range is a slice of the age bitmaps
+    if age_range is not None:
+        low = np.searchsorted(cube_levels['age'], age_range[0], side='left')
+        high = max(low, np.searchsorted(cube_levels['age'], age_range[1], side='right'))
+        bitmap = bitmap & np.bitwise_or.reduce(bitmaps['age'][low:high], axis=0)
+
+    bitmap.flags.writeable = False
+
+    return bitmap
+
+
+@timed('filter')
+def filter_bitmap(study='All', ethnic='All', age_range=None):
+    # Slider values are lists, the cache needs a tuple
+    return _filter_bitmap(study, ethnic, None if age_range is None else tuple(age_range))
+
+
+# Unknown values (not in the data) match no row
+def value_bitmap(col, value):
+    if value not in cube_levels[col]:
+        return np.zeros_like(bitmaps[col][0])
+
+    return bitmaps[col][cube_levels[col].index(value)]
+
+
+# Row positions of df matching the filters
+@timed('filter')
+def filter_rows(study='All', ethnic='All', age_range=None):
+    return np.flatnonzero(np.unpackbits(filter_bitmap(study, ethnic, age_range), count=len(df)))
+
+
+# data[col].value_counts() of the filtered rows, read from the bitmaps without selecting rows
+@timed('aggregate')
+def bitmap_counts(col, study='All', ethnic='All', age_range=None):
+    bitmap = filter_bitmap(study, ethnic, age_range)
+    counts = pd.Series(popcount[bitmap & bitmaps[col]].sum(axis=1), index=cube_levels[col], name=col)
+
+    return counts[counts > 0].sort_values(ascending=False)
 
 ########################################################
 ###################### Dashboard #######################
@@ -158,18 +346,10 @@ config={'displaylogo' : False,
     }
 
 
-def study_func(data_frame, col, col2, tick_size, tick_angle):
+def study_func(data_frame, col, col2, tick_size, tick_angle, min_count=5):
     data = groupby(data_frame, col, 'satis_2')
-    # Get rid of field od study where count < 10
-    # Apply function to get count and percentage
-    filter_ = get_proportion(data_frame, col).sort_values(by='percentage', ascending=False)
-
-
-    # Get list of field of study names where count > 10
-    filter_ = filter_[filter_['count'] > 5].index.tolist()
-
-    # Filter data to get only rows that contain names on the list
-    mask = data[data[col].str.contains('|'.join(filter_))]
+    # Get rid of field of study where count <= min_count
+    mask = filter_min_count(data, data_frame, col, min_count)
 
     fig = px.bar(
         # Data
@@ -230,18 +410,10 @@ def study_func(data_frame, col, col2, tick_size, tick_angle):
 
     return fig
 
-def duration_func(data_frame, col, col2, tick_size, tick_angle):
+def duration_func(data_frame, col, col2, tick_size, tick_angle, min_count=5):
     data = groupby(data_frame, col, col2)
-    # Get rid of field od study where count < 10
-    # Apply function to get count and percentage
-
-    filter_ = get_proportion(data_frame, col).sort_values(by='percentage', ascending=False)
-
-    # Get list of field of study names where count > 10
-    filter_ = filter_[filter_['count'] > 5].index.tolist()
-
-    # Filter data to get only rows that contain names on the list
-    mask = data[data[col].str.contains('|'.join(filter_))]
+    # Get rid of field of study where count <= min_count
+    mask = filter_min_count(data, data_frame, col, min_count)
 
     column = col2
 
@@ -309,6 +481,315 @@ def duration_func(data_frame, col, col2, tick_size, tick_angle):
 
     return fig
 
+# Commentaries shown by the BooleanSwitches (static, hidden until the switch is on)
+commentaries = {
+    'txt': [dcc.Markdown([
+        "L'histrogramme nous indique que **la grande majorité des participants ont entre 20 et 30 ans.** "
+        "Nous observons également que l'âge médian des hommes (27 ans) n'est que **d'une année plus élévé** que celui des femmes (26 ans). "
+        "Les femmes sont représentées à hauteur de **49,73%** contre **50,27%** pour les hommes. ",
+        
+        "\nNous nous attendions à cette distribution des âges puisqu'il nous était indiqué que **les participants "
+        "étaient des étudiants d'études supérieures**. Le nombre d'hommes et femmes et quasiment égal, il n'y a eu que des "
+        "*dates* entre sexe opposé (nous avions vérifié lors de l'EDA disponible sur GitHub."])
+    ],
+    'txt2': [dcc.Markdown([
+        "La section *Business* est de loin **la plus représentée avec 130 personnes** et un grande nombre d'hommes **(77%)**\n",
+        "La section *Engineering* est elle aussi composée de **77% d'hommes.**" 
+        " Les sections *Social Science*, *Education*, *Social Work* et *English* **sont constituée très majoritairement de femmes**.\n",
+
+        "\nOn remarque que les sections les plus représentées sont aussi celles avec le pourcentage d'hommes le plus élevé." ,
+        " Mais la part des femmes est rattrapée sur certaines sections atteignant parfois 96% *(Social Work)*, 87% *(Education)*"])
+    ],
+    'txt3': [
+        "Pas grand chose à développer ici, si ce n'est une part importe des Caucasians sur l'ensemble des groupes ethniques.", html.Br(),
+        "Pas de difference importante de part entre hommes et femmes parmis tous ces groupes."
+    ]
+}
+
+# Figures shown by the BooleanSwitches : (function, col, col2, tick_size, tick_angle, height)
+static_graphs = {
+    'study_satis': (study_func, 'field_of_study', 'satis_2', 9, 45, '700px'),
+    'ethnic_satis': (study_func, 'ethnic_group', 'satis_2', 11, 0, '400px'),
+    'study_duration_graph': (duration_func, 'field_of_study', 'length', 9, 45, '700px'),
+    'ethnic_duration_graph': (duration_func, 'ethnic_group', 'length', 11, 0, '400px'),
+    'study_ndate_graph': (duration_func, 'field_of_study', 'speed_date_nb', 9, 45, '700px'),
+    'ethnic_ndate_graph': (duration_func, 'ethnic_group', 'speed_date_nb', 11, 0, '400px')
+}
+
+
+# The figures never change (full data) : built once for this data and version of the app (layout_figures)
+def build_static_figure(graph_id):
+    func, col, col2, tick_size, tick_angle, height = static_graphs[graph_id]
+
+    return func(
+        df,
+        col=col,
+        col2=col2,
+        tick_size=tick_size,
+        tick_angle=tick_angle
+    )
+
+
+# Graph of the layout, its figure is fetched by the browser when the switch first shows it
+def static_graph(graph_id):
+    func, col, col2, tick_size, tick_angle, height = static_graphs[graph_id]
+
+    return [
+        dcc.Graph(
+            id=graph_id,
+            style={
+                "height": height,
+                "width": "100%"
+            },
+            config=config
+        )
+    ]
+
+# Above this number of rows, the age histogram is binned on the server (constant size figure)
+hist_max_rows = 5000
+
+
+# Box plot statistics of ages given their counts, with the plotly rules :
+# linear interpolated quartiles, whiskers at the furthest ages within 1.5 IQR
+@timed('aggregate')
+def box_stats(ages, counts):
+    cumulated = np.cumsum(counts)
+    n = cumulated[-1]
+
+    def quantile(p):
+        position = min(max(p * n - 0.5, 0), n - 1)
+        below, above = np.searchsorted(cumulated, [np.floor(position), np.ceil(position)], side='right')
+        return ages[below] + (ages[above] - ages[below]) * (position % 1)
+
+    q1, median, q3 = quantile(.25), quantile(.5), quantile(.75)
+    observed = ages[counts > 0]
+    inside = (observed >= q1 - 1.5 * (q3 - q1)) & (observed <= q3 + 1.5 * (q3 - q1))
+
+    stats = {
+        'q1': [q1],
+        'median': [median],
+        'q3': [q3],
+        'lowerfence': [observed[inside].min()],
+        'upperfence': [observed[inside].max()]
+    }
+
+    return stats, observed[~inside]
+
+
+# Age histogram and box plots per gender from the cube counts : one bar per age
+# instead of one point per participant
+def binned_hist(study, ethnic):
+    counts = cube_sum(['gender', 'age'], study, ethnic)
+    ages = np.array(cube_levels['age'])
+
+    fig = go.Figure()
+
+    for gender, gender_counts, color in zip(cube_levels['gender'], counts, ['#d07670', '#3596b6']):
+        if gender_counts.sum() == 0:
+            continue
+
+        fig.add_bar(x=ages[gender_counts > 0], y=gender_counts[gender_counts > 0],
+                    name=gender, legendgroup=gender, marker_color=color, opacity=.9,
+                    hovertemplate='gender=' + gender + '<br>age=%{x}<br>count=%{y}<extra></extra>')
+
+        stats, outliers = box_stats(ages, gender_counts)
+        fig.add_box(y=[gender], orientation='h', **stats,
+                    name=gender, legendgroup=gender, marker_color=color, showlegend=False,
+                    xaxis='x2', yaxis='y2')
+        fig.add_scatter(x=outliers, y=[gender] * len(outliers), mode='markers',
+                        name=gender, legendgroup=gender, marker_color=color, showlegend=False,
+                        xaxis='x2', yaxis='y2')
+
+    # Same axes as the plotly express marginal box
+    fig.update_layout(
+        barmode='overlay',
+        bargap=0,
+        xaxis=dict(domain=[0, 1]),
+        yaxis=dict(domain=[0, 0.7326]),
+        xaxis2=dict(domain=[0, 1], matches='x', showticklabels=False, showgrid=True),
+        yaxis2=dict(domain=[0.7426, 1], showticklabels=False, showline=False, ticks='', showgrid=False)
+    )
+
+    return fig
+
+# Satisfaction, duration and number of dates bars : plotly express arguments by column
+measure_bars = {
+    'satis_2': dict(hover_name='count',
+                    colors=['lightgrey', 'darkred', 'red', '#fbff89', 'lightgreen', 'green']),
+    'length': dict(hover_name='length',
+                   colors=['lightgrey', 'darkred', 'red', 'lightgreen']),
+    'speed_date_nb': dict(hover_name='speed_date_nb',
+                          colors=['lightgrey', 'darkred', 'red', 'lightgreen'])
+}
+
+
+def px_measure_bar(data2, col, title, title_font_size):
+    fig = px.bar(
+        # Data
+        data2.sort_values(by=col, ascending=False),
+        hover_data=data2,
+        hover_name=measure_bars[col]['hover_name'],
+        x='percentage',
+        y='gender',
+
+        # Legend & annotate
+        color=col,
+        text='percentage',
+
+        # Colors
+        color_discrete_sequence=measure_bars[col]['colors'],
+        opacity=.8,
+        # Cross shape
+        pattern_shape=col,
+        pattern_shape_sequence=[
+            "x",
+            "",
+            "",
+            "",
+            "",
+            ""]
+    )
+
+    # Titles, axes
+    fig.update_layout(
+        paper_bgcolor='rgba(0, 0, 0, 0)',
+        margin=dict(t=50, b=50, l=10, r=10),
+        #template='plotly_dark',
+        title_text=title,
+        title_font_size=title_font_size,
+        title_x=0.5,
+        title_y=.9,
+        legend_traceorder="reversed",
+        yaxis_title=None,
+        xaxis_title=None,
+        legend_title=None,
+        legend_orientation='h',
+        legend_valign='middle',
+        legend_x=-0.01,
+        legend_y=-0.1
+    )
+
+    # Annotate percentage
+    fig.update_traces(texttemplate='<b>%{text} %</b>',
+                      textposition='inside',
+                      textfont_size=10,
+                      insidetextanchor="middle")
+
+    return fig
+
+
+def px_gender_bar(data):
+    fig = px.bar(data,
+                 y='count',
+                 x=data.index,
+                 color=data.index,
+                 text='percentage',
+                 color_discrete_sequence=['#d07670', '#3596b6'])
+
+    fig.update_layout(
+        paper_bgcolor='rgba(0, 0, 0, 0)',
+        margin=dict(t=50, b=50, l=20, r=10),
+        title_text=None,
+        title_x=0.5,
+        xaxis_title=None,
+        yaxis_title=None,
+        legend_title=None,
+        showlegend=False
+    )
+
+    fig.update_traces(texttemplate='%{text} %')
+
+    return fig
+
+
+# Figure factory : plotly express builds each chart once from the full data (skeleton of styled
+# traces and layout), the callbacks then only send the data arrays (gender_bar, measure_patch)
+def build_skeleton(chart):
+    if chart == 'gender':
+        return px_gender_bar(get_proportion(None, 'gender', counts=bitmap_counts('gender')))
+
+    return px_measure_bar(cube_groupby('gender', chart), chart, None, 15)
+
+
+skeleton_charts = ['gender', 'satis_2', 'length', 'speed_date_nb']
+
+
+# Skeleton as a figure dictionary (JSON, read back from layout_figures)
+def skeleton(chart):
+    return layout_figures['skeletons'][chart]
+
+
+# Values typed like the skeleton array : numeric arrays (typed arrays {'dtype', 'bdata'} with
+# plotly 6, numpy arrays before) keep their float or int type, other arrays are lists
+def like(template, values):
+    if isinstance(template, dict):
+        return np.asarray(values, dtype='float64' if template['dtype'].startswith('f') else 'int64')
+
+    if isinstance(template, np.ndarray):
+        return np.asarray(values, dtype=template.dtype)
+
+    return list(values)
+
+
+# Trace array : frame column(s)
+def measure_arrays(col):
+    return {
+        'x': 'percentage',
+        'y': 'gender',
+        'text': 'percentage',
+        'customdata': [col, 'count'],
+        'hovertext': measure_bars[col]['hover_name']
+    }
+
+
+# Partial update of a graph showing skeleton(col) : only the trace arrays, the trace visibility
+# (col values without rows are hidden instead of removed) and the title are sent. Every call sets
+# all of them, so the result does not depend on the previous figure and can be cached
+def measure_patch(data2, col, title, title_font_size):
+    figure = skeleton(col)
+    data2 = data2.sort_values(by=col, ascending=False)
+    arrays = measure_arrays(col)
+
+    patch = Patch()
+    for i, trace in enumerate(figure['data']):
+        rows = data2[data2[col] == trace['name']]
+
+        patch['data'][i]['visible'] = len(rows) > 0
+        for key, column in arrays.items():
+            patch['data'][i][key] = like(trace[key], rows[column].to_numpy())
+
+    patch['layout']['title']['text'] = title
+    patch['layout']['title']['font']['size'] = title_font_size
+
+    return patch
+
+
+# Same figure as px_gender_bar, one trace per row (colors follow the rows order)
+def gender_bar(data):
+    figure = skeleton('gender')
+
+    traces = []
+    for i, gender in enumerate(data.index):
+        trace = figure['data'][i % len(figure['data'])]
+        traces.append({
+            **trace,
+            'name': gender,
+            'legendgroup': gender,
+            'x': like(trace['x'], [gender]),
+            'y': like(trace['y'], [data['count'][gender]]),
+            'text': like(trace['text'], [data['percentage'][gender]])
+        })
+
+    layout = dict(figure['layout'])
+    layout['xaxis'] = {**layout['xaxis'], 'categoryarray': list(data.index)}
+
+    # Without rows plotly express sets no category order
+    if len(data) == 0:
+        layout['xaxis'] = {key: value for key, value in layout['xaxis'].items()
+                           if key not in ('categoryorder', 'categoryarray')}
+
+    return {'data': traces, 'layout': layout}
+
 # --------------------------------------------------------
 
 app = Dash(__name__, external_stylesheets=[dbc.themes.FLATLY],
@@ -317,6 +798,64 @@ app = Dash(__name__, external_stylesheets=[dbc.themes.FLATLY],
 
 server = app.server
 
+# Latency by phase, response size and cache results of the callbacks, on /metrics. Several workers
+# share their series through METRICS_DIR
+instrument(server, app.callback_map)
+
+# Callback requests profiled on demand (PROFILE_CALLBACKS, PROFILE_SECRET), saved in PROFILE_DIR
+enable_profiling(server)
+
+# Version of the app : content hash of its code, and the plotly version (figures JSON)
+app_version = '-'.join([file_digest(path) for path in ('main.py', 'cache.py', 'data.py')] + [plotly.__version__])
+
+# Cached figures are only valid for this data and this version of the app
+cache_fingerprint = '-'.join([fingerprint('participants'), fingerprint('dates'), app_version])
+
+# Serialized figures of the filter callbacks, by callback and inputs. FIGURE_CACHE_URL (redis://host:port/db
+# or a directory) shares them between the workers, for FIGURE_CACHE_TTL seconds. Redis keeps at most
+# FIGURE_CACHE_MAX_ENTRIES figures (a full warm-up needs about 87000)
+figure_cache = LRUCache(
+    maxsize=512,
+    shared=shared_cache(os.environ.get('FIGURE_CACHE_URL'), ttl=int(os.environ.get('FIGURE_CACHE_TTL', 86400)),
+                        max_entries=int(os.environ.get('FIGURE_CACHE_MAX_ENTRIES', 10000))),
+    namespace=cache_fingerprint
+)
+
+# Snapshot of the figures saved when the process stops and restored at start (if the fingerprint matches).
+# FIGURE_CACHE_SNAPSHOT sets its path, empty to disable it
+figure_snapshot = os.environ.get('FIGURE_CACHE_SNAPSHOT', os.path.join(cache_dir, 'figures.json.gz'))
+
+if figure_snapshot:
+    figure_cache.load(figure_snapshot, cache_fingerprint)
+    atexit.register(figure_cache.save, figure_snapshot, cache_fingerprint)
+
+
+# Skeletons and static graph figures (JSON), built by plotly express from the full data
+def build_layout_figures():
+    return {
+        'skeletons': {chart: json.loads(serialize(build_skeleton(chart))) for chart in skeleton_charts},
+        'static': {graph_id: json.loads(serialize(build_static_figure(graph_id))) for graph_id in static_graphs}
+    }
+
+
+# Building them takes most of the start of a process (about 1.8 s) : they are kept next to the Feather
+# files for this data and version of the app, the next processes read them back
+layout_version = hashlib.sha1(cache_fingerprint.encode()).hexdigest()[:16]
+layout_figures = persisted(cache_dir, 'layout_figures', layout_version, build_layout_figures)
+
+# Static graph figures as served, out of the initial layout (the switches fetch them on first display)
+static_figure_bodies = {graph_id: json.dumps(figure) for graph_id, figure in layout_figures['static'].items()}
+
+
+# The url holds the layout version (see show_static_graph) : browsers and proxies keep the figure
+@server.route(f'{app.config.routes_pathname_prefix}static-figures/<graph_id>.json')
+def static_figure(graph_id):
+    if graph_id not in static_figure_bodies:
+        abort(404)
+
+    return Response(static_figure_bodies[graph_id], mimetype='application/json',
+                    headers={'Cache-Control': 'public, max-age=31536000, immutable'})
+
 ########################################################
 ###################### App Layout ######################
 ########################################################
@@ -438,7 +977,7 @@ app.layout = dbc.Container([
 
     dbc.Row([
         dbc.Col([
-            html.Div(id='txt'),
+            html.Div(id='txt', children=commentaries['txt'], style={'display': 'none'}),
             html.Br()
         ],xl=8, lg=8, md=8, xs=12)
     ],justify='center', style={"background-color": "#f5f8fc"}),
@@ -517,7 +1056,7 @@ app.layout = dbc.Container([
 
     dbc.Row([
         dbc.Col([
-            html.Div(id='txt2'),
+            html.Div(id='txt2', children=commentaries['txt2'], style={'display': 'none'}),
             html.Br()
         ], xl=8, lg=8, md=8, xs=12)
     ], justify='center', style={"background-color": "#f5f8fc"}),
@@ -592,7 +1131,7 @@ app.layout = dbc.Container([
 
     dbc.Row([
         dbc.Col([
-            html.Div(id='txt3'),
+            html.Div(id='txt3', children=commentaries['txt3'], style={'display': 'none'}),
             html.Br()
         ], xl=8, lg=8, md=8, xs=12)
     ], justify='center', style={"background-color": "#f5f8fc"}),
@@ -673,7 +1212,8 @@ app.layout = dbc.Container([
         dbc.Col([
             dcc.Graph(
                 id='satis_bar',
-                figure={},
+                # Updated with measure_patch
+                figure=skeleton('satis_2'),
                 style={
                     "height": "300px",
                     "width": "100%"
@@ -706,7 +1246,8 @@ dbc.Row([
         dbc.Col([
             html.Div(
                 id = 'graph_container',
-                children=[]),
+                children=static_graph('study_satis'),
+                style={'display': 'none'}),
 
         ], xl=8, lg=8, md=8, xs=12)
     ], justify='center', style={"background-color": "#f5f8fc"}),
@@ -732,7 +1273,8 @@ dbc.Row([
         dbc.Col([
             html.Div(
                 id = 'graph_container2',
-                children=[])
+                children=static_graph('ethnic_satis'),
+                style={'display': 'none'})
         ], xl=6, lg=8, md=8, xs=12)
     ], justify='center', style={"background-color": "#f5f8fc"}),
 
@@ -821,7 +1363,8 @@ dbc.Row([
 
             dcc.Graph(
                 id='duration_bar',
-                figure={},
+                # Updated with measure_patch
+                figure=skeleton('length'),
                 style={
                     "height": "300px",
                     "width": "100%"
@@ -856,7 +1399,8 @@ dbc.Row([
 
             html.Div(
                 id = 'graph_container_duration_study',
-                children=[]),
+                children=static_graph('study_duration_graph'),
+                style={'display': 'none'}),
 
         ], xl=8, lg=8, md=8, xs=12)
     ], justify='center', style={"background-color": "#f5f8fc"}),
@@ -885,7 +1429,8 @@ dbc.Row([
 
             html.Div(
                 id = 'graph_container_duration_ethnic',
-                children=[])
+                children=static_graph('ethnic_duration_graph'),
+                style={'display': 'none'})
 
         ], xl=6, lg=8, md=8, xs=12)
     ], justify='center', style={"background-color": "#f5f8fc"}),
@@ -976,7 +1521,8 @@ dbc.Row([
 
             dcc.Graph(
                 id='ndate_bar',
-                figure={},
+                # Updated with measure_patch
+                figure=skeleton('speed_date_nb'),
                 style={
                     "height": "300px",
                     "width": "100%"
@@ -1011,7 +1557,8 @@ dbc.Row([
 
             html.Div(
                 id = 'graph_container_ndate_study',
-                children=[]),
+                children=static_graph('study_ndate_graph'),
+                style={'display': 'none'}),
 
         ], xl=8, lg=8, md=8, xs=12)
     ], justify='center', style={"background-color": "#f5f8fc"}),
@@ -1040,7 +1587,8 @@ dbc.Row([
 
             html.Div(
                 id = 'graph_container_ndate_ethnic',
-                children=[])
+                children=static_graph('ethnic_ndate_graph'),
+                style={'display': 'none'})
 
         ], xl=6, lg=8, md=8, xs=12)
     ], justify='center', style={"background-color": "#f5f8fc"})
@@ -1060,28 +1608,27 @@ dbc.Row([
     Input('ethnic', 'value')
 )
 
+@figure_cache.memoize('hist')
 def update_hist(study, ethnic):
-    if study == 'All':
-        data = df
-    else:
-        data = df[df['field_of_study'] == study]
-
-    if ethnic == 'All':
-        data = data
-    else:
-        data = data[data["ethnic_group"] == ethnic]
+    rows = filter_rows(study, ethnic)
 
     colors = ['rgb(0, 0, 100)', 'rgb(0, 200, 200)']
 
-    fig = px.histogram(
-        data, x="age",
-        color="gender",
-        marginal="box",  # or violin, rug
-        hover_data=data.columns,
-        barmode='overlay',
-        color_discrete_sequence=['#d07670', '#3596b6'],
-        opacity=.9
-    )
+    # Large selections are binned on the server rather than sending every row
+    if len(rows) > hist_max_rows:
+        fig = binned_hist(study, ethnic)
+    else:
+        data = df.iloc[rows]
+
+        fig = px.histogram(
+            data, x="age",
+            color="gender",
+            marginal="box",  # or violin, rug
+            hover_data=data.columns,
+            barmode='overlay',
+            color_discrete_sequence=['#d07670', '#3596b6'],
+            opacity=.9
+        )
 
     # Titles, axes
     fig.update_layout(
@@ -1105,71 +1652,20 @@ def update_hist(study, ethnic):
     Input('ethnic', 'value')
 )
 
+@figure_cache.memoize('gender_bar')
 def update_bar(study, ethnic):
-    if study == 'All':
-        data = df
-    else:
-        data = df[df['field_of_study'] == study]
-
-    if ethnic == 'All':
-        data = data
-    else:
-        data = data[data["ethnic_group"] == ethnic]
-
-    data = get_proportion(data, 'gender')
-
-    fig = px.bar(data,
-                 y='count',
-                 x=data.index,
-                 color=data.index,
-                 text='percentage',
-                 color_discrete_sequence=['#d07670', '#3596b6'])
-
-    fig.update_layout(
-        paper_bgcolor='rgba(0, 0, 0, 0)',
-        margin=dict(t=50, b=50, l=20, r=10),
-        title_text=None,
-        title_x=0.5,
-        xaxis_title=None,
-        yaxis_title=None,
-        legend_title=None,
-        showlegend=False
-    )
+    data = get_proportion(None, 'gender', counts=bitmap_counts('gender', study, ethnic))
 
-    fig.update_traces(texttemplate='%{text} %')
-
-    return fig
-
-@app.callback(
-    Output('txt', 'children'),
-    Input('BSwitch', 'on')
-)
-
-def update_result(value):
-    children = [dcc.Markdown([
-        "L'histrogramme nous indique que **la grande majorité des participants ont entre 20 et 30 ans.** "
-        "Nous observons également que l'âge médian des hommes (27 ans) n'est que **d'une année plus élévé** que celui des femmes (26 ans). "
-        "Les femmes sont représentées à hauteur de **49,73%** contre **50,27%** pour les hommes. ",
-        
-        "\nNous nous attendions à cette distribution des âges puisqu'il nous était indiqué que **les participants "
-        "étaient des étudiants d'études supérieures**. Le nombre d'hommes et femmes et quasiment égal, il n'y a eu que des "
-        "*dates* entre sexe opposé (nous avions vérifié lors de l'EDA disponible sur GitHub."])
-    ]
-
-    if value == True:
-        return children
-    else:
-        return None
+    return gender_bar(data)
 
 @app.callback(
     Output('field_study', 'figure'),
     Input('ageSlider', 'value')
 )
 
+@figure_cache.memoize('field_study')
 def update_hbar(age):
-    ages = [i for i in range(age[0], age[1] + 1)]
-    data = df[df['age'].isin(ages)]
-    data = groupby(data, 'field_of_study', 'gender')
+    data = cube_groupby('field_of_study', 'gender', age_range=age)
 
     fig = px.bar(
         data.sort_values(by='field_of_study', ascending=True),
@@ -1204,10 +1700,9 @@ def update_hbar(age):
     Input('ageSlider2', 'value')
 )
 
+@figure_cache.memoize('ethnic_bar')
 def update_hbar(age):
-    ages = [i for i in range(age[0], age[1] + 1)]
-    data = df[df['age'].isin(ages)]
-    data = groupby(data, 'ethnic_group', 'gender')
+    data = cube_groupby('ethnic_group', 'gender', age_range=age)
 
     fig = px.bar(
         data.sort_values(by='count', ascending=False),
@@ -1237,43 +1732,6 @@ def update_hbar(age):
 
     return fig
 
-@app.callback(
-    Output('txt2', 'children'),
-    Input('BSwitch2', 'on')
-)
-
-def update_result(value):
-    children = [dcc.Markdown([
-        "La section *Business* est de loin **la plus représentée avec 130 personnes** et un grande nombre d'hommes **(77%)**\n",
-        "La section *Engineering* est elle aussi composée de **77% d'hommes.**" 
-        " Les sections *Social Science*, *Education*, *Social Work* et *English* **sont constituée très majoritairement de femmes**.\n",
-
-        "\nOn remarque que les sections les plus représentées sont aussi celles avec le pourcentage d'hommes le plus élevé." ,
-        " Mais la part des femmes est rattrapée sur certaines sections atteignant parfois 96% *(Social Work)*, 87% *(Education)*"])
-    ]
-
-    if value == True:
-        return children
-    else:
-        return None
-
-@app.callback(
-    Output('txt3', 'children'),
-    Input('BSwitch3', 'on')
-)
-
-def update_result(value):
-    children = [
-        "Pas grand chose à développer ici, si ce n'est une part importe des Caucasians sur l'ensemble des groupes ethniques.", html.Br(),
-        "Pas de difference importante de part entre hommes et femmes parmis tous ces groupes." \
-    ]
-
-    if value == True:
-        return children
-    else:
-        return None
-
-
 @app.callback(
     Output('satis_bar', 'figure'),
     Input('ageSlider3', 'value'),
@@ -1281,50 +1739,10 @@ def update_result(value):
     Input('study2', 'value')
 )
 
+@figure_cache.memoize('satis_bar')
 def update_graph(age, ethnic, study):
 
-    ages = [i for i in range(age[0], age[1] + 1)]
-    if study == 'All':
-        data = df
-    else:
-        data = df[df['field_of_study'] == study]
-
-    if ethnic == 'All':
-        data = data
-    else:
-        data = data[data["ethnic_group"] == ethnic]
-
-    #data = data[data['field_of_study'] == study]
-    data = data[data['age'].isin(ages)]
-
-    data2 = groupby(data, 'gender', 'satis_2')
-
-    fig = px.bar(
-        # Data
-        data2.sort_values(by='satis_2', ascending=False),
-        hover_data=data2,
-        hover_name='count',
-        x='percentage',
-        y='gender',
-
-        # Legend & annotate
-        color='satis_2',
-        text='percentage',
-
-        # Colors
-        color_discrete_sequence=['lightgrey', 'darkred', 'red', '#fbff89', 'lightgreen', 'green'],
-        opacity=.8,
-        # Cross shape
-        pattern_shape='satis_2',
-        pattern_shape_sequence=[
-            "x",
-            "",
-            "",
-            "",
-            "",
-            ""]
-    )
-
+    data2 = cube_groupby('gender', 'satis_2', study, ethnic, age)
 
     if study in df['field_of_study'].unique() and ethnic in df['ethnic_group'].unique():
         title = f'Satisfaction ({study}, {ethnic})'
@@ -1343,94 +1761,7 @@ def update_graph(age, ethnic, study):
     else:
         title_font_size = 15
 
-
-    # Titles, axes
-    fig.update_layout(
-        paper_bgcolor='rgba(0, 0, 0, 0)',
-        margin=dict(t=50, b=50, l=10, r=10),
-        #template='plotly_dark',
-        title_text=title,
-        title_font_size=title_font_size,
-        title_x=0.5,
-        title_y=.9,
-        legend_traceorder="reversed",
-        yaxis_title=None,
-        xaxis_title=None,
-        legend_title=None,
-        legend_orientation='h',
-        legend_valign='middle',
-        legend_x=-0.01,
-        legend_y=-0.1
-    )
-
-    # Annotate percentage
-    fig.update_traces(texttemplate='<b>%{text} %</b>',
-                      textposition='inside',
-                      textfont_size=10,
-                      insidetextanchor="middle")
-
-    return fig
-
-@app.callback(
-    Output('graph_container', 'children'),
-    Input('BSwitch4', 'on')
-    )
-
-def show_graph(value):
-
-    children = [
-        dcc.Graph(
-            id="study_satis",
-            figure=study_func(
-                df,
-                col='field_of_study',
-                col2="satis_2",
-                tick_size=9,
-                tick_angle=45
-            ),
-            style={
-                "height": "700px",
-                "width": "100%"
-            },
-            config=config
-        )
-    ]
-
-    if value == True:
-        return children
-    else:
-        return None
-
-@app.callback(
-    Output('graph_container2', 'children'),
-    Input('BSwitch5', 'on')
-    )
-
-def show_graph(value):
-
-    children = [
-        dcc.Graph(
-            id="ethnic_satis",
-            figure=study_func(
-                df,
-                col='ethnic_group',
-                col2="satis_2",
-                tick_size=11,
-                tick_angle=0
-            ),
-            style={
-                "height": "400px",
-                "width": "100%"
-            },
-            config=config
-        )
-    ]
-
-    if value == True:
-        return children
-    else:
-        return None
-
+    return measure_patch(data2, 'satis_2', title, title_font_size)
 
 @app.callback(
     Output('duration_bar', 'figure'),
@@ -1439,50 +1770,10 @@ def show_graph(value):
     Input('study_duration', 'value')
 )
 
+@figure_cache.memoize('duration_bar')
 def update_graph(age, ethnic, study):
 
-    ages = [i for i in range(age[0], age[1] + 1)]
-    if study == 'All':
-        data = df
-    else:
-        data = df[df['field_of_study'] == study]
-
-    if ethnic == 'All':
-        data = data
-    else:
-        data = data[data["ethnic_group"] == ethnic]
-
-    #data = data[data['field_of_study'] == study]
-    data = data[data['age'].isin(ages)]
-
-    data2 = groupby(data, 'gender', 'length')
-
-    fig = px.bar(
-        # Data
-        data2.sort_values(by="length", ascending=False),
-        hover_data=data2,
-        hover_name='length',
-        x='percentage',
-        y='gender',
-
-        # Legend & annotate
-        color='length',
-        text='percentage',
-
-        # Colors
-        color_discrete_sequence=['lightgrey', 'darkred', 'red', 'lightgreen'],
-        opacity=.8,
-        # Cross shape
-        pattern_shape='length',
-        pattern_shape_sequence=[
-            "x",
-            "",
-            "",
-            "",
-            "",
-            ""]
-    )
-
+    data2 = cube_groupby('gender', 'length', study, ethnic, age)
 
     if study in df['field_of_study'].unique() and ethnic in df['ethnic_group'].unique():
         title = f'Thought on date duration ({study}, {ethnic})'
@@ -1501,93 +1792,7 @@ def update_graph(age, ethnic, study):
     else:
         title_font_size = 15
 
-
-    # Titles, axes
-    fig.update_layout(
-        paper_bgcolor='rgba(0, 0, 0, 0)',
-        margin=dict(t=50, b=50, l=10, r=10),
-        #template='plotly_dark',
-        title_text=title,
-        title_font_size=title_font_size,
-        title_x=0.5,
-        title_y=.9,
-        legend_traceorder="reversed",
-        yaxis_title=None,
-        xaxis_title=None,
-        legend_title=None,
-        legend_orientation='h',
-        legend_valign='middle',
-        legend_x=-0.01,
-        legend_y=-0.1
-    )
-
-    # Annotate percentage
-    fig.update_traces(texttemplate='<b>%{text} %</b>',
-                      textposition='inside',
-                      textfont_size=10,
-                      insidetextanchor="middle")
-
-    return fig
-
-@app.callback(
-    Output('graph_container_duration_study', 'children'),
-    Input('BSwitch_duration_study', 'on')
-    )
-
-def show_graph(value):
-
-    children = [
-        dcc.Graph(
-            id="study_duration_graph",
-            figure=duration_func(
-                df,
-                col='field_of_study',
-                col2="length",
-                tick_size=9,
-                tick_angle=45
-            ),
-            style={
-                "height": "700px",
-                "width": "100%"
-            },
-            config=config
-        )
-    ]
-
-    if value == True:
-        return children
-    else:
-        return None
-
-@app.callback(
-    Output('graph_container_duration_ethnic', 'children'),
-    Input('BSwitch_duration_ethnic', 'on')
-    )
-
-def show_graph(value):
-
-    children = [
-        dcc.Graph(
-            id="ethnic_duration_graph",
-            figure=duration_func(
-                df,
-                col='ethnic_group',
-                col2="length",
-                tick_size=11,
-                tick_angle=0
-            ),
-            style={
-                "height": "400px",
-                "width": "100%"
-            },
-            config=config
-        )
-    ]
-
-    if value == True:
-        return children
-    else:
-        return None
+    return measure_patch(data2, 'length', title, title_font_size)
 
 #########################################################
 ################### Number of date ######################
@@ -1600,50 +1805,10 @@ def show_graph(value):
     Input('study_ndate', 'value')
 )
 
+@figure_cache.memoize('ndate_bar')
 def update_graph(age, ethnic, study):
 
-    ages = [i for i in range(age[0], age[1] + 1)]
-    if study == 'All':
-        data = df
-    else:
-        data = df[df['field_of_study'] == study]
-
-    if ethnic == 'All':
-        data = data
-    else:
-        data = data[data["ethnic_group"] == ethnic]
-
-    #data = data[data['field_of_study'] == study]
-    data = data[data['age'].isin(ages)]
-
-    data2 = groupby(data, 'gender', 'speed_date_nb')
-
-    fig = px.bar(
-        # Data
-        data2.sort_values(by="speed_date_nb", ascending=False),
-        hover_data=data2,
-        hover_name='speed_date_nb',
-        x='percentage',
-        y='gender',
-
-        # Legend & annotate
-        color='speed_date_nb',
-        text='percentage',
-
-        # Colors
-        color_discrete_sequence=['lightgrey', 'darkred', 'red', 'lightgreen'],
-        opacity=.8,
-        # Cross shape
-        pattern_shape='speed_date_nb',
-        pattern_shape_sequence=[
-            "x",
-            "",
-            "",
-            "",
-            "",
-            ""]
-    )
-
+    data2 = cube_groupby('gender', 'speed_date_nb', study, ethnic, age)
 
     if study in df['field_of_study'].unique() and ethnic in df['ethnic_group'].unique():
         title = f'Thought on number of dates ({study}, {ethnic})'
@@ -1662,93 +1827,64 @@ def update_graph(age, ethnic, study):
     else:
         title_font_size = 15
 
+    return measure_patch(data2, 'speed_date_nb', title, title_font_size)
 
-    # Titles, axes
-    fig.update_layout(
-        paper_bgcolor='rgba(0, 0, 0, 0)',
-        margin=dict(t=50, b=50, l=10, r=10),
-        #template='plotly_dark',
-        title_text=title,
-        title_font_size=title_font_size,
-        title_x=0.5,
-        title_y=.9,
-        legend_traceorder="reversed",
-        yaxis_title=None,
-        xaxis_title=None,
-        legend_title=None,
-        legend_orientation='h',
-        legend_valign='middle',
-        legend_x=-0.01,
-        legend_y=-0.1
-    )
+# -------------------- Switches ------------------------
 
-    # Annotate percentage
-    fig.update_traces(texttemplate='<b>%{text} %</b>',
-                      textposition='inside',
-                      textfont_size=10,
-                      insidetextanchor="middle")
+# Commentaries and static graphs are already in the layout : the switches show or hide them
+# in the browser, without a request to the server
+toggle_visibility = """
+function(on) {
+    return on ? {} : {'display': 'none'};
+}
+"""
 
-    return fig
+switch_targets = [
+    ('BSwitch', 'txt'),
+    ('BSwitch2', 'txt2'),
+    ('BSwitch3', 'txt3')
+]
 
-@app.callback(
-    Output('graph_container_ndate_study', 'children'),
-    Input('BSwitch_ndate_study', 'on')
-    )
+for switch, target in switch_targets:
+    app.clientside_callback(toggle_visibility, Output(target, 'style'), Input(switch, 'on'))
 
-def show_graph(value):
+# The static graph figures are left out of the initial layout : the first display fetches the figure
+# (static_figure, cached by the browser), the next ones only toggle the visibility
+show_static_graph = """
+function(on, figure) {
+    var style = on ? {} : {'display': 'none'};
 
-    children = [
-        dcc.Graph(
-            id="study_ndate_graph",
-            figure=duration_func(
-                df,
-                col='field_of_study',
-                col2="speed_date_nb",
-                tick_size=9,
-                tick_angle=45
-            ),
-            style={
-                "height": "700px",
-                "width": "100%"
-            },
-            config=config
-        )
-    ]
-
-    if value == True:
-        return children
-    else:
-        return None
-
-@app.callback(
-    Output('graph_container_ndate_ethnic', 'children'),
-    Input('BSwitch_ndate_ethnic', 'on')
-    )
-
-def show_graph(value):
-
-    children = [
-        dcc.Graph(
-            id="ethnic_ndate_graph",
-            figure=duration_func(
-                df,
-                col='ethnic_group',
-                col2="speed_date_nb",
-                tick_size=11,
-                tick_angle=0
-            ),
-            style={
-                "height": "400px",
-                "width": "100%"
-            },
-            config=config
-        )
-    ]
+    if (!on || (figure && figure.data)) {
+        return [style, window.dash_clientside.no_update];
+    }
 
-    if value == True:
-        return children
-    else:
-        return None
+    return fetch('%s')
+        .then(function(response) {
+            if (!response.ok) {
+                throw new Error(response.statusText);
+            }
+            return response.json();
+        })
+        .then(function(figure) { return [style, figure]; })
+        .catch(function() { return [style, window.dash_clientside.no_update]; });
+}
+"""
+
+# (switch, container, graph)
+static_graph_targets = [
+    ('BSwitch4', 'graph_container', 'study_satis'),
+    ('BSwitch5', 'graph_container2', 'ethnic_satis'),
+    ('BSwitch_duration_study', 'graph_container_duration_study', 'study_duration_graph'),
+    ('BSwitch_duration_ethnic', 'graph_container_duration_ethnic', 'ethnic_duration_graph'),
+    ('BSwitch_ndate_study', 'graph_container_ndate_study', 'study_ndate_graph'),
+    ('BSwitch_ndate_ethnic', 'graph_container_ndate_ethnic', 'ethnic_ndate_graph')
+]
+
+for switch, container, graph_id in static_graph_targets:
+    url = app.get_relative_path(f'/static-figures/{graph_id}.json') + f'?v={layout_version}'
+    app.clientside_callback(show_static_graph % url,
+                            Output(container, 'style'), Output(graph_id, 'figure'),
+                            Input(switch, 'on'), State(graph_id, 'figure'))
 
 
 # ------------------- Run server -----------------------
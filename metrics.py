@@ -0,0 +1,269 @@
+import functools
+import glob
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+from flask import Response, request
+
+# Dash callback requests
+callback_path = '/_dash-update-component'
+
+# Histogram buckets : seconds and bytes
+latency_buckets = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+payload_buckets = (1e3, 2.5e3, 5e3, 1e4, 2.5e4, 5e4, 1e5, 2.5e5, 5e5, 1e6, 5e6)
+
+
+def format_labels(labels):
+    return ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                    for name, value in labels)
+
+
+# Prometheus histogram : observations by label values, exposed in the text format
+class Histogram:
+    def __init__(self, name, help, label_names, buckets):
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self.buckets = buckets
+        # Label values : (cumulative bucket counts, count, sum)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        with self._lock:
+            buckets, count, total = self._series.get(label_values, ([0] * len(self.buckets), 0, 0.))
+
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    buckets[i] += 1
+
+            self._series[label_values] = (buckets, count + 1, total + value)
+
+    # Series as JSON : [label values, bucket counts, count, sum]
+    def snapshot(self):
+        with self._lock:
+            return [[list(key), list(buckets), count, total] for key, (buckets, count, total) in self._series.items()]
+
+    # Adds the series of a snapshot (of another process) to this one
+    def add(self, snapshot):
+        with self._lock:
+            for label_values, buckets, count, total in snapshot:
+                key = tuple(label_values)
+                current, current_count, current_total = self._series.get(key, ([0] * len(self.buckets), 0, 0.))
+                self._series[key] = ([a + b for a, b in zip(current, buckets)], current_count + count,
+                                     current_total + total)
+
+    def empty(self):
+        return Histogram(self.name, self.help, self.label_names, self.buckets)
+
+    def lines(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} histogram'
+
+        with self._lock:
+            series = sorted((key, (list(buckets), count, total)) for key, (buckets, count, total) in self._series.items())
+
+        for label_values, (buckets, count, total) in series:
+            labels = list(zip(self.label_names, label_values))
+
+            for bound, bucket in zip(self.buckets, buckets):
+                yield f'{self.name}_bucket{{{format_labels(labels + [("le", bound)])}}} {bucket}'
+
+            yield f'{self.name}_bucket{{{format_labels(labels + [("le", "+Inf")])}}} {count}'
+            yield f'{self.name}_sum{{{format_labels(labels)}}} {total}'
+            yield f'{self.name}_count{{{format_labels(labels)}}} {count}'
+
+
+# Prometheus counter by label values
+class Counter:
+    def __init__(self, name, help, label_names):
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self._series = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def inc(self, label_values):
+        with self._lock:
+            self._series[label_values] += 1
+
+    # Series as JSON : [label values, value]
+    def snapshot(self):
+        with self._lock:
+            return [[list(key), value] for key, value in self._series.items()]
+
+    def add(self, snapshot):
+        with self._lock:
+            for label_values, value in snapshot:
+                self._series[tuple(label_values)] += value
+
+    def empty(self):
+        return Counter(self.name, self.help, self.label_names)
+
+    def lines(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} counter'
+
+        with self._lock:
+            series = sorted(self._series.items())
+
+        for label_values, value in series:
+            yield f'{self.name}{{{format_labels(zip(self.label_names, label_values))}}} {value}'
+
+
+latency = Histogram('dash_callback_seconds', 'Callback wall time by phase (total for the whole request)',
+                    ['callback', 'phase'], latency_buckets)
+payload = Histogram('dash_callback_response_bytes', 'Callback response size', ['callback'], payload_buckets)
+# Results : hit (process cache), shared_hit (shared backend), coalesced (waited for an identical request), miss
+cache_results = Counter('dash_callback_cache_total', 'Figure cache results', ['callback', 'result'])
+
+collectors = [latency, payload, cache_results]
+
+# Series file of this process in the metrics directory, by pid (a forked worker gets its own). The
+# start time in the name keeps a reused pid from overwriting the file of a dead worker
+_process_files = {}
+
+
+# Phases of the callback request handled by this thread
+class Record:
+    def __init__(self, callback):
+        self.callback = callback
+        self.start = time.perf_counter()
+        # Exclusive time (nested phases excluded) by phase
+        self.phases = defaultdict(float)
+        # Time of the nested phases, for each running phase
+        self.nested = []
+        self.cache = None
+
+
+_local = threading.local()
+
+
+# Times the calls of a function as a phase (filter, aggregate, figure, serialization) of the
+# current callback request. Out of a request the function is called as is
+def timed(phase):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            record = getattr(_local, 'record', None)
+
+            if record is None:
+                return func(*args, **kwargs)
+
+            record.nested.append(0.)
+            start = time.perf_counter()
+
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                record.phases[phase] += elapsed - record.nested.pop()
+
+                if record.nested:
+                    record.nested[-1] += elapsed
+
+        return wrapper
+
+    return decorator
+
+
+# Cache result (hit, shared_hit, coalesced, miss) of the current callback request
+def mark_cache(result):
+    record = getattr(_local, 'record', None)
+
+    if record is not None:
+        record.cache = result
+
+
+# Records the callback request, labelled by its output id. Ids missing from callbacks (made up by the
+# client) share the unknown label, so that they do not add series
+def start_record(callbacks):
+    _local.record = None
+
+    if request.path.endswith(callback_path):
+        body = request.get_json(silent=True) or {}
+        output = body.get('output')
+        _local.record = Record(output if isinstance(output, str) and output in callbacks else 'unknown')
+
+
+def end_record(response, directory=None):
+    record = getattr(_local, 'record', None)
+
+    if record is not None:
+        _local.record = None
+        total = time.perf_counter() - record.start
+
+        for phase, seconds in record.phases.items():
+            latency.observe((record.callback, phase), seconds)
+
+        # Request parsing, Dash response encoding... (time out of the timed phases)
+        latency.observe((record.callback, 'other'), max(total - sum(record.phases.values()), 0.))
+        latency.observe((record.callback, 'total'), total)
+        payload.observe((record.callback,), response.calculate_content_length() or len(response.get_data()))
+
+        if record.cache is not None:
+            cache_results.inc((record.callback, record.cache))
+
+        if directory:
+            dump(directory)
+
+    return response
+
+
+# Writes the series of this process to its file of directory (replaced at once, never read half written)
+def dump(directory):
+    pid = os.getpid()
+
+    if pid not in _process_files:
+        _process_files[pid] = os.path.join(directory, f'{pid}-{time.time_ns()}.json')
+
+    path = _process_files[pid]
+    tmp_path = f'{path}.tmp'
+
+    try:
+        os.makedirs(directory, exist_ok=True)
+        with open(tmp_path, 'w') as f:
+            json.dump({collector.name: collector.snapshot() for collector in collectors}, f)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+
+# Sum of the series of all the processes (the files of directory), those of stopped workers included
+# so that the counters never go back
+def aggregate(directory):
+    totals = [collector.empty() for collector in collectors]
+
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        try:
+            with open(path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+
+        for total in totals:
+            total.add(snapshot.get(total.name, []))
+
+    return totals
+
+
+def exposition(directory=None):
+    sources = aggregate(directory) if directory else collectors
+    lines = [line for collector in sources for line in collector.lines()]
+
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+
+# Records the callback requests of the Flask server, exposes the metrics on path. callbacks : the
+# registered output ids (app.callback_map, filled as the callbacks are declared).
+# Each process keeps its own series : with several workers behind one port, directory (METRICS_DIR,
+# emptied when the app is deployed) collects the series of every worker and the metrics are their sum
+def instrument(server, callbacks, path='/metrics', directory=None):
+    directory = directory or os.environ.get('METRICS_DIR')
+
+    server.before_request(functools.partial(start_record, callbacks))
+    server.after_request(functools.partial(end_record, directory=directory))
+    server.add_url_rule(path, 'metrics', functools.partial(exposition, directory))
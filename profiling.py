@@ -0,0 +1,125 @@
+import argparse
+import cProfile
+import hashlib
+import hmac
+import itertools
+import os
+import re
+import threading
+import time
+
+from flask import request
+
+# Dash callback requests
+callback_path = '/_dash-update-component'
+
+# Header of the requests to profile : '<expiry>:<signature>', the expiry a unix timestamp and the signature
+# the hex HMAC-SHA256 of '<callback output id>:<expiry>' (e.g. satis_bar.figure:1760000000) with the
+# PROFILE_SECRET key. A captured header is only good until its expiry
+signature_header = 'X-Profile-Signature'
+
+_local = threading.local()
+
+# Profiles saved by this process, so that the files of the same second do not overwrite each other
+_profile_count = itertools.count()
+
+
+def signature(secret, callback, expires):
+    message = f'{callback}:{expires}'.encode()
+    return hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+
+
+# Header value profiling callback for ttl seconds
+def signed_header(secret, callback, ttl=3600):
+    expires = int(time.time()) + ttl
+    return f'{expires}:{signature(secret, callback, expires)}'
+
+
+# Whether header is a valid, unexpired signature of callback
+def check_header(secret, callback, header):
+    expires, _, digest = header.partition(':')
+
+    if not (expires.isascii() and expires.isdigit()) or int(expires) < time.time():
+        return False
+
+    return hmac.compare_digest(digest.encode(), signature(secret, callback, int(expires)).encode())
+
+
+# Profile file name : time, process and profile number, callback id and inputs (file name safe)
+def profile_name(callback, inputs):
+    values = '_'.join(str(item.get('value')) for item in inputs if isinstance(item, dict))
+    name = re.sub(r'[^A-Za-z0-9.-]+', '_', f'{callback}_{values}')[:150]
+
+    return f"{time.strftime('%Y%m%d-%H%M%S')}_{os.getpid()}-{next(_profile_count)}_{name}.pstats"
+
+
+# Profiles the callback requests selected by PROFILE_CALLBACKS (output ids separated by commas, or all)
+# or signed with PROFILE_SECRET, and saves them (pstats) in directory. Nothing is registered, so
+# nothing is paid, when both variables are unset
+def enable_profiling(server, directory=None):
+    callbacks = {callback.strip() for callback in os.environ.get('PROFILE_CALLBACKS', '').split(',') if callback.strip()}
+    secret = os.environ.get('PROFILE_SECRET')
+    directory = directory or os.environ.get('PROFILE_DIR', 'profiles')
+
+    if not callbacks and not secret:
+        return False
+
+    def selected(callback):
+        if 'all' in callbacks or callback in callbacks:
+            return True
+
+        header = request.headers.get(signature_header)
+        return bool(secret and header and check_header(secret, callback, header))
+
+    def start_profile():
+        _local.profile = None
+
+        if request.path.endswith(callback_path):
+            body = request.get_json(silent=True) or {}
+            callback = body.get('output', 'unknown')
+
+            if isinstance(callback, str) and selected(callback):
+                profiler = cProfile.Profile()
+
+                # Python 3.12+ allows one profiler at a time : a request overlapping a profiled one
+                # (threaded server) is not profiled
+                try:
+                    profiler.enable()
+                except ValueError:
+                    return
+
+                _local.profile = (profiler, profile_name(callback, body.get('inputs', [])))
+
+    def end_profile(response):
+        profile = getattr(_local, 'profile', None)
+
+        if profile is not None:
+            _local.profile = None
+            profiler, name = profile
+            profiler.disable()
+
+            try:
+                os.makedirs(directory, exist_ok=True)
+                profiler.dump_stats(os.path.join(directory, name))
+            except OSError:
+                pass
+
+        return response
+
+    server.before_request(start_profile)
+    server.after_request(end_profile)
+
+    return True
+
+
+if __name__ == '__main__':
+    # e.g. curl -H "X-Profile-Signature: $(python profiling.py satis_bar.figure)" ...
+    parser = argparse.ArgumentParser(description=f'{signature_header} header value (PROFILE_SECRET key)')
+    parser.add_argument('callback', help='callback output id, e.g. satis_bar.figure')
+    parser.add_argument('--ttl', type=int, default=3600, help='seconds before the signature expires')
+    args = parser.parse_args()
+
+    if not os.environ.get('PROFILE_SECRET'):
+        parser.exit(1, 'PROFILE_SECRET is not set\n')
+
+    print(signed_header(os.environ['PROFILE_SECRET'], args.callback, ttl=args.ttl))
@@ -0,0 +1,10 @@
+import os
+import sys
+
+# main.py reads the csv files from the working directory
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+os.chdir(root)
+
+# Tests do not save a figure snapshot at exit
+os.environ['FIGURE_CACHE_SNAPSHOT'] = ''
@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+
+from main import df, cube_levels, cube_sum, cube_groupby, bitmap_counts, filter_rows, box_stats
+
+# Dropdown values (unknown ones and None for a cleared dropdown included) and slider ranges
+studies = ['All'] + df['field_of_study'].cat.categories.tolist() + ['Astrology', None]
+ethnics = ['All'] + sorted(df['ethnic_group'].unique()) + ['Martian', None]
+age_ranges = [None, [18, 39], [22, 25], [27, 27], [39, 39], [40, 55]]
+
+
+# Row filtering of the callbacks before the cube and bitmap indexes
+def pandas_filter(study, ethnic, age_range):
+    data = df
+
+    if study != 'All':
+        data = data[data['field_of_study'] == study]
+
+    if ethnic != 'All':
+        data = data[data['ethnic_group'] == ethnic]
+
+    if age_range is not None:
+        data = data[data['age'].isin(range(age_range[0], age_range[1] + 1))]
+
+    return data
+
+
+# Observed pairs of the filtered rows (pandas groupby) : {(col_1 value, col_2 value): (count, percentage)}
+def pandas_pairs(data, col_1, col_2):
+    count = data.groupby([col_1, col_2], observed=True).size()
+    percentage = round(100 * count / count.groupby(level=0).transform('sum'), 2)
+
+    return {pair: (c, p) for pair, c, p in zip(count.index, count, percentage) if c > 0}
+
+
+def observed_pairs(frame, col_1, col_2):
+    frame = frame[frame['count'] > 0]
+
+    return {(a, b): (count, percentage) for a, b, count, percentage
+            in zip(frame[col_1], frame[col_2], frame['count'], frame['percentage'])}
+
+
+@pytest.mark.parametrize('study', studies)
+@pytest.mark.parametrize('ethnic', ethnics)
+def test_cube_groupby(study, ethnic):
+    for age_range in age_ranges:
+        data = pandas_filter(study, ethnic, age_range)
+
+        for col_1, col_2 in [('gender', 'satis_2'), ('gender', 'length'), ('gender', 'speed_date_nb'),
+                             ('field_of_study', 'gender'), ('ethnic_group', 'gender')]:
+            result = cube_groupby(col_1, col_2, study, ethnic, age_range)
+
+            assert observed_pairs(result, col_1, col_2) == pandas_pairs(data, col_1, col_2)
+            assert result['count'].sum() == len(data)
+
+
+@pytest.mark.parametrize('study', studies)
+@pytest.mark.parametrize('ethnic', ethnics)
+def test_bitmap_counts(study, ethnic):
+    for age_range in age_ranges:
+        data = pandas_filter(study, ethnic, age_range)
+        assert df.iloc[filter_rows(study, ethnic, age_range)].index.tolist() == data.index.tolist()
+
+        for col in ['gender', 'field_of_study', 'ethnic_group']:
+            counts = bitmap_counts(col, study, ethnic, age_range)
+            expected = data[col].value_counts()
+
+            assert counts.to_dict() == expected[expected > 0].to_dict()
+            assert counts.is_monotonic_decreasing
+
+
+# Quartiles (plotly : linear interpolation, 'hazen'), whiskers and outliers of the expanded ages
+def check_box_stats(ages, counts):
+    stats, outliers = box_stats(ages, counts)
+    values = np.repeat(ages, counts)
+    q1, median, q3 = np.percentile(values, [25, 50, 75], method='hazen')
+
+    assert np.allclose([stats['q1'][0], stats['median'][0], stats['q3'][0]], [q1, median, q3])
+
+    inside = (values >= q1 - 1.5 * (q3 - q1)) & (values <= q3 + 1.5 * (q3 - q1))
+    assert stats['lowerfence'][0] == values[inside].min()
+    assert stats['upperfence'][0] == values[inside].max()
+    assert sorted(outliers) == sorted(set(values[~inside]))
+
+
+@pytest.mark.parametrize('study', studies[:-2])
+@pytest.mark.parametrize('ethnic', ethnics[:-2])
+def test_box_stats(study, ethnic):
+    ages = np.array(cube_levels['age'])
+
+    for gender_counts in cube_sum(['gender', 'age'], study, ethnic):
+        if gender_counts.sum() > 0:
+            check_box_stats(ages, gender_counts)
+
+
+@pytest.mark.parametrize('seed', range(50))
+def test_box_stats_random(seed):
+    rng = np.random.default_rng(seed)
+    ages = np.arange(18, 56)
+    counts = rng.integers(0, 5, len(ages)) * (rng.random(len(ages)) < .4)
+    counts[rng.integers(len(ages))] += 1
+
+    check_box_stats(ages, counts)
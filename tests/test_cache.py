@@ -0,0 +1,250 @@
+import gzip
+import threading
+import time
+
+import pytest
+
+from cache import LRUCache, DiskCache, RedisCache, call_key, persisted
+
+
+def test_lru_eviction():
+    cache = LRUCache(maxsize=2)
+    cache.set('a', '1')
+    cache.set('b', '2')
+    # 'a' becomes the most recently used, 'b' is evicted
+    cache.get('a')
+    cache.set('c', '3')
+
+    assert cache.get('b') is None
+    assert cache.get('a') == '1'
+    assert cache.get('c') == '3'
+    assert cache.info()['size'] == 2
+
+
+def test_compute_single_flight():
+    cache = LRUCache()
+    calls = []
+    started = threading.Event()
+
+    def func():
+        calls.append(1)
+        started.set()
+        time.sleep(.2)
+        return 'value'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.compute('key', func))) for _ in range(10)]
+    threads[0].start()
+    started.wait()
+    for thread in threads[1:]:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert calls == [1]
+    assert results == ['value'] * 10
+    assert cache.info()['coalesced'] == 9
+
+
+def test_compute_shares_errors():
+    cache = LRUCache()
+    started = threading.Event()
+
+    def func():
+        started.set()
+        time.sleep(.2)
+        raise ValueError('boom')
+
+    errors = []
+
+    def run():
+        try:
+            cache.compute('key', func)
+        except ValueError as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=run) for _ in range(3)]
+    threads[0].start()
+    started.wait()
+    for thread in threads[1:]:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(errors) == 3
+    assert cache.get('key') is None
+
+
+def test_snapshot_fingerprint(tmp_path):
+    path = str(tmp_path / 'figures.json.gz')
+    cache = LRUCache()
+    key = call_key('satis_bar', ([20, 30], 'All', 'Law'))
+    cache.set(key, '{"data": []}')
+    cache.save(path, 'v1')
+
+    restored = LRUCache()
+    assert restored.load(path, 'v1') == 1
+    assert restored.get(key) == '{"data": []}'
+
+    # Other data or code version : nothing restored
+    stale = LRUCache()
+    assert stale.load(path, 'v2') == 0
+    assert stale.info()['size'] == 0
+
+
+def test_unreadable_snapshot_is_ignored(tmp_path):
+    path = tmp_path / 'figures.json.gz'
+    cache = LRUCache()
+    for i in range(200):
+        cache.set(call_key('hist', (str(i), 'All')), '{"data": [%d]}' % i)
+    cache.save(str(path), 'v1')
+
+    # Truncated gzip (EOFError), not gzip, JSON of another shape
+    path.write_bytes(path.read_bytes()[:len(path.read_bytes()) // 2])
+    assert LRUCache().load(str(path), 'v1') == 0
+
+    path.write_bytes(b'not a snapshot')
+    assert LRUCache().load(str(path), 'v1') == 0
+
+    path.write_bytes(gzip.compress(b'[1, 2]'))
+    assert LRUCache().load(str(path), 'v1') == 0
+
+
+def test_failed_snapshot_leaves_no_temporary_file(tmp_path):
+    cache = LRUCache()
+    cache.set(('hist', 'All', 'All'), '{}')
+    # The destination is a directory : the final rename fails
+    (tmp_path / 'figures.json.gz').mkdir()
+    cache.save(str(tmp_path / 'figures.json.gz'), 'v1')
+
+    assert [path.name for path in tmp_path.iterdir()] == ['figures.json.gz']
+
+
+def test_snapshot_keeps_previous_when_empty(tmp_path):
+    path = str(tmp_path / 'figures.json.gz')
+    cache = LRUCache()
+    cache.set(('hist', 'All', 'All'), '{}')
+    cache.save(path, 'v1')
+    LRUCache().save(path, 'v1')
+
+    assert LRUCache().load(path, 'v1') == 1
+
+
+def test_shared_backend_between_caches():
+    pytest.importorskip('fakeredis')
+    import fakeredis
+
+    backend = RedisCache(fakeredis.FakeRedis())
+    first, second = LRUCache(shared=backend, namespace='v1'), LRUCache(shared=backend, namespace='v1')
+    other = LRUCache(shared=backend, namespace='v2')
+    calls = []
+
+    def func():
+        calls.append(1)
+        return 'value'
+
+    assert first.compute('key', func) == 'value'
+    assert second.compute('key', func) == 'value'
+    assert second.info()['shared_hits'] == 1
+    # Another namespace (data fingerprint) does not see the figure
+    other.compute('key', func)
+    assert len(calls) == 2
+
+
+def test_redis_ttl():
+    pytest.importorskip('fakeredis')
+    import fakeredis
+
+    backend = RedisCache(fakeredis.FakeRedis(), ttl=1)
+    assert backend.ping()
+    backend.set('key', 'value')
+    assert backend.get('key') == 'value'
+
+    time.sleep(1.1)
+    assert backend.get('key') is None
+
+
+def test_redis_max_entries():
+    pytest.importorskip('fakeredis')
+    import fakeredis
+
+    backend = RedisCache(fakeredis.FakeRedis(), max_entries=3)
+    for i in range(5):
+        backend.set(str(i), str(i))
+        time.sleep(.01)
+
+    # Oldest entries evicted, with their index entries
+    assert [backend.get(str(i)) for i in range(5)] == [None, None, '2', '3', '4']
+    assert backend.client.zcard(backend.index) == 3
+
+    backend.clear()
+    assert backend.client.keys('*') == []
+
+
+# Client of a store that cannot be reached
+class UnreachableClient:
+    def __getattr__(self, name):
+        import redis
+
+        def fail(*args, **kwargs):
+            raise redis.ConnectionError('unreachable')
+
+        return fail
+
+
+def test_redis_unreachable_is_a_miss():
+    pytest.importorskip('redis')
+
+    backend = RedisCache(UnreachableClient())
+    assert not backend.ping()
+    assert not backend.set('key', 'value')
+    assert backend.get('key') is None
+
+    cache = LRUCache(shared=backend)
+    assert cache.compute('key', lambda: 'value') == 'value'
+    assert cache.get('key') == 'value'
+    assert not cache.store('other', 'value')
+
+
+def test_disk_cache(tmp_path):
+    pytest.importorskip('diskcache')
+
+    backend = DiskCache(str(tmp_path), ttl=1)
+    assert backend.ping()
+    assert backend.set('key', 'value')
+    assert DiskCache(str(tmp_path)).get('key') == 'value'
+
+    time.sleep(1.1)
+    assert backend.get('key') is None
+
+
+def test_disk_cache_size_limit(tmp_path):
+    pytest.importorskip('diskcache')
+
+    backend = DiskCache(str(tmp_path), size_limit=100000)
+    for i in range(100):
+        backend.set(str(i), 'x' * 5000)
+
+    assert backend._cache.volume() < 300000
+    assert backend.get('0') is None
+    assert backend.get('99') is not None
+
+
+def test_persisted_is_built_once_per_version(tmp_path):
+    builds = []
+
+    def build():
+        builds.append(1)
+        return {'figure': {'data': [len(builds)]}}
+
+    assert persisted(str(tmp_path), 'figures', 'v1', build) == {'figure': {'data': [1]}}
+    assert persisted(str(tmp_path), 'figures', 'v1', build) == {'figure': {'data': [1]}}
+    assert len(builds) == 1
+
+    # New version : rebuilt, the previous file removed
+    assert persisted(str(tmp_path), 'figures', 'v2', build) == {'figure': {'data': [2]}}
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['figures.v2.json']
+
+    # Unreadable file : rebuilt
+    (tmp_path / 'figures.v2.json').write_text('{"fig')
+    assert persisted(str(tmp_path), 'figures', 'v2', build) == {'figure': {'data': [3]}}
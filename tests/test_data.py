@@ -0,0 +1,30 @@
+import pandas as pd
+import pytest
+
+from data import apply_schema, dates_schema, participants_schema
+
+
+def test_out_of_range_values_are_refused():
+    with pytest.raises(ValueError, match='int16'):
+        apply_schema(pd.DataFrame({'iid': [1, 40000]}), {'iid': 'int16'})
+
+    with pytest.raises(ValueError, match='Int8'):
+        apply_schema(pd.DataFrame({'age': [20, None, 300]}), {'age': 'Int8'})
+
+
+def test_in_range_values_are_kept():
+    df = apply_schema(pd.DataFrame({'age': [20, None, 55]}), {'age': 'Int8'})
+    assert df['age'].tolist() == [20, pd.NA, 55]
+
+
+# Ids and row numbers of exports 100 times larger than the csv
+def test_ids_fit_large_exports():
+    columns = ['Unnamed: 0', 'iid']
+
+    df = apply_schema(pd.DataFrame({'Unnamed: 0': [0, 837700], 'iid': [1, 55000]}),
+                      {col: participants_schema[col] for col in columns})
+    assert df.max().tolist() == [837700, 55000]
+
+    df = apply_schema(pd.DataFrame({'Unnamed: 0': [0, 1, 837700], 'iid': [1, None, 55000]}),
+                      {col: dates_schema[col] for col in columns})
+    assert df.max().tolist() == [837700, 55000]
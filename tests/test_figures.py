@@ -0,0 +1,71 @@
+import base64
+import copy
+import json
+
+import numpy as np
+import plotly.io as pio
+import pytest
+
+from main import cube_groupby, measure_patch, px_measure_bar, skeleton
+
+
+# JSON of a figure, typed arrays ({'dtype', 'bdata'}) decoded as lists
+def decode(value):
+    if isinstance(value, dict):
+        if {'dtype', 'bdata'} <= set(value) <= {'dtype', 'bdata', 'shape'}:
+            array = np.frombuffer(base64.b64decode(value['bdata']), dtype=value['dtype'])
+            if 'shape' in value:
+                array = array.reshape([int(size) for size in str(value['shape']).split(',')])
+            return array.tolist()
+        return {key: decode(item) for key, item in value.items()}
+
+    if isinstance(value, list):
+        return [decode(item) for item in value]
+
+    return value
+
+
+def as_json(figure):
+    return decode(json.loads(pio.to_json(figure, validate=False)))
+
+
+# Figure the browser shows : the patch operations applied to the skeleton, hidden traces left out
+def apply_patch(figure, patch):
+    figure = copy.deepcopy(figure)
+
+    for operation in as_json(patch)['operations']:
+        assert operation['operation'] == 'Assign'
+        *path, last = operation['location']
+        target = figure
+        for key in path:
+            target = target[key]
+        target[last] = operation['params']['value']
+
+    figure['data'] = [trace for trace in figure['data'] if trace.pop('visible')]
+
+    return figure
+
+
+@pytest.mark.parametrize('col', ['satis_2', 'length', 'speed_date_nb'])
+@pytest.mark.parametrize('study, ethnic, age_range', [
+    ('All', 'All', None),
+    ('All', 'All', [18, 39]),
+    ('Law', 'Caucasian', [20, 30]),
+    ('Business / Econ / Finance', 'All', [25, 25]),
+    ('Film', 'Asian', [18, 39]),
+    ('All', 'African American', [30, 39]),
+    # No participant
+    ('Astrology', 'All', [18, 39]),
+    (None, None, [18, 39]),
+    ('All', 'All', [40, 55])
+])
+@pytest.mark.parametrize('title, title_font_size', [
+    ('Overall satisfaction', 15),
+    ('Satisfaction (Law, Caucasian)', 15),
+    ('Satisfaction (Medical Science, Pharmaceuticals and Bio Tech)', 12)
+])
+def test_measure_patch(col, study, ethnic, age_range, title, title_font_size):
+    data2 = cube_groupby('gender', col, study, ethnic, age_range)
+    patched = apply_patch(as_json(skeleton(col)), measure_patch(data2, col, title, title_font_size))
+
+    assert patched == as_json(px_measure_bar(data2, col, title, title_font_size))
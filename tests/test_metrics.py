@@ -0,0 +1,92 @@
+import json
+import threading
+import time
+
+import pytest
+from flask import Flask
+
+from cache import LRUCache, RedisCache
+from metrics import cache_results, callback_path, instrument, latency
+
+
+def test_unregistered_outputs_share_the_unknown_label():
+    server = Flask(__name__)
+    server.add_url_rule(callback_path, 'callback', lambda: '{}', methods=['POST'])
+    instrument(server, {'satis_bar.figure': {}}, path='/test-metrics')
+    client = server.test_client()
+
+    client.post(callback_path, json={'output': 'satis_bar.figure'})
+
+    for i in range(20):
+        client.post(callback_path, json={'output': f'made_up_{i}.figure'})
+
+    client.post(callback_path, json={'output': ['not', 'a', 'string']})
+
+    labels = {callback for callback, phase in latency._series}
+    assert 'satis_bar.figure' in labels
+    assert 'unknown' in labels
+    assert not any(label.startswith('made_up') for label in labels)
+    assert latency._series[('unknown', 'total')][1] == 21
+
+
+def test_cache_results_are_counted():
+    pytest.importorskip('fakeredis')
+    import fakeredis
+
+    backend = RedisCache(fakeredis.FakeRedis())
+    cache, other = LRUCache(shared=backend), LRUCache(shared=backend)
+    started = threading.Event()
+
+    def render():
+        started.set()
+        time.sleep(.2)
+        return '{}'
+
+    def callback(name):
+        (other if name == 'other' else cache).compute('key', render)
+        return '{}'
+
+    server = Flask(__name__)
+    server.add_url_rule(f'/<name>{callback_path}', 'callback', callback, methods=['POST'])
+    instrument(server, {'cached.figure': {}}, path='/test-metrics')
+
+    def post(name='first'):
+        server.test_client().post(f'/{name}{callback_path}', json={'output': 'cached.figure'})
+
+    # One request renders, two wait for it, then one finds it in the process, another in the backend
+    threads = [threading.Thread(target=post) for _ in range(3)]
+    threads[0].start()
+    started.wait()
+    for thread in threads[1:]:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    post()
+    post('other')
+
+    counts = {result: count for (callback, result), count in cache_results._series.items() if callback == 'cached.figure'}
+    assert counts == {'miss': 1, 'coalesced': 2, 'hit': 1, 'shared_hit': 1}
+
+
+# Series of the workers (files of the metrics directory) are summed, those of stopped workers included
+def test_series_of_all_workers_are_summed(tmp_path):
+    worker = latency.empty()
+    worker.observe(('shared.figure', 'total'), .5)
+    worker.observe(('shared.figure', 'total'), 20)
+    results = cache_results.empty()
+    results.inc(('shared.figure', 'miss'))
+    (tmp_path / '1-0.json').write_text(json.dumps({worker.name: worker.snapshot(), results.name: results.snapshot()}))
+    # Half written or foreign files are skipped
+    (tmp_path / '2-0.json').write_text('{"dash_callback')
+
+    server = Flask(__name__)
+    server.add_url_rule(callback_path, 'callback', lambda: '{}', methods=['POST'])
+    instrument(server, {'shared.figure': {}}, path='/test-metrics', directory=str(tmp_path))
+    client = server.test_client()
+    client.post(callback_path, json={'output': 'shared.figure'})
+
+    lines = client.get('/test-metrics').data.decode().splitlines()
+    assert 'dash_callback_seconds_count{callback="shared.figure",phase="total"} 3' in lines
+    assert 'dash_callback_seconds_bucket{callback="shared.figure",phase="total",le="1"} 2' in lines
+    assert 'dash_callback_cache_total{callback="shared.figure",result="miss"} 1' in lines
+    assert len(list(tmp_path.glob('*.json'))) == 3
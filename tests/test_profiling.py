@@ -0,0 +1,45 @@
+import time
+
+from flask import Flask
+
+import profiling
+from profiling import callback_path, check_header, enable_profiling, profile_name, signature, signed_header
+
+
+def test_signature_expires():
+    header = signed_header('secret', 'satis_bar.figure', ttl=60)
+    assert check_header('secret', 'satis_bar.figure', header)
+    assert not check_header('secret', 'hist.figure', header)
+    assert not check_header('other', 'satis_bar.figure', header)
+
+    expired = int(time.time()) - 1
+    assert not check_header('secret', 'satis_bar.figure', f"{expired}:{signature('secret', 'satis_bar.figure', expired)}")
+
+    # The expiry is signed : pushing it back invalidates the signature
+    expires, digest = header.split(':')
+    assert not check_header('secret', 'satis_bar.figure', f'{int(expires) + 3600}:{digest}')
+    assert not check_header('secret', 'satis_bar.figure', digest)
+
+
+def test_profile_names_are_unique():
+    inputs = [{'id': 'study', 'property': 'value', 'value': 'Law'}]
+    assert len({profile_name('hist.figure', inputs) for _ in range(5)}) == 5
+
+
+# Python 3.12+ refuses a second active profiler
+class BusyProfile:
+    def enable(self):
+        raise ValueError('Another profiling tool is already active')
+
+
+def test_overlapping_profile_is_skipped(tmp_path, monkeypatch):
+    monkeypatch.setenv('PROFILE_CALLBACKS', 'all')
+    monkeypatch.setattr(profiling.cProfile, 'Profile', BusyProfile)
+    server = Flask(__name__)
+    server.add_url_rule(callback_path, 'callback', lambda: '{}', methods=['POST'])
+    enable_profiling(server, directory=str(tmp_path))
+
+    response = server.test_client().post(callback_path, json={'output': 'hist.figure'})
+
+    assert response.status_code == 200
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,51 @@
+import pandas as pd
+import pytest
+
+from main import df, groupby, satis_level, len_satis_level, date_nb_satis
+
+
+# Loop versions replaced by sort_levels() : rank of each col_2 value, other values last
+def loop_sort(groupby_data, col_2, order):
+    index = []
+
+    for i in range(len(groupby_data)):
+        if groupby_data[col_2][i] in order:
+            index.append(order.index(groupby_data[col_2][i]) + 1)
+        else:
+            index.append(len(order) + 1)
+
+    groupby_data['index'] = index
+
+    return groupby_data.sort_values(by='index')
+
+
+def loop_satis_level(data, col_1, col_2):
+    return loop_sort(groupby(data, col_1, col_2), col_2,
+                     ['Very satisfied', 'Satisfied', 'Neutral', 'Not satisfied', 'Not satisfied at all'])
+
+
+def loop_len_satis_level(data, col_1, col_2):
+    return loop_sort(groupby(data, col_1, col_2), col_2, ['Just right', 'Too little', 'Too much'])
+
+
+def loop_date_nb_satis(data, col_1, col_2):
+    return loop_sort(groupby(data, col_1, col_2), col_2, ['Just right', 'Too few', 'Too many'])
+
+
+cases = [
+    (satis_level, loop_satis_level, 'satis_2'),
+    (len_satis_level, loop_len_satis_level, 'length'),
+    (date_nb_satis, loop_date_nb_satis, 'speed_date_nb')
+]
+
+# The csv, then random subsets (small ones miss some values)
+subsets = [None] + [(frac, seed) for frac in (.01, .1, .5) for seed in range(5)]
+
+
+@pytest.mark.parametrize('subset', subsets)
+@pytest.mark.parametrize('col_1', ['field_of_study', 'ethnic_group', 'gender'])
+@pytest.mark.parametrize('func, loop_func, col_2', cases)
+def test_same_as_loop(func, loop_func, col_2, col_1, subset):
+    data = df if subset is None else df.sample(frac=subset[0], random_state=subset[1])
+
+    pd.testing.assert_frame_equal(func(data, col_1, col_2), loop_func(data, col_1, col_2))
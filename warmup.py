@@ -0,0 +1,79 @@
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from cache import call_key, serialize
+from main import df, figure_cache
+
+# Inputs the UI can produce : dropdown options and integer age ranges of the sliders (up to 39)
+studies = ['All'] + sorted(df['field_of_study'].unique())
+ethnics = ['All'] + sorted(df['ethnic_group'].unique())
+age_ranges = [[low, high] for low in range(int(df['age'].min()), 40) for high in range(low, 40)]
+
+# Callback inputs (in the order of their arguments), by cache name
+callback_inputs = {
+    'satis_bar': [(age, ethnic, study) for age in age_ranges for ethnic in ethnics for study in studies],
+    'duration_bar': [(age, ethnic, study) for age in age_ranges for ethnic in ethnics for study in studies],
+    'ndate_bar': [(age, ethnic, study) for age in age_ranges for ethnic in ethnics for study in studies],
+    'hist': [(study, ethnic) for study in studies for ethnic in ethnics],
+    'gender_bar': [(study, ethnic) for study in studies for ethnic in ethnics]
+}
+
+
+# Runs in the pool processes : (cache key, serialized figure)
+def render(job):
+    name, args = job
+
+    return call_key(name, args), serialize(figure_cache.functions[name](*args))
+
+
+# Renders the missing figures of the callbacks in a process pool, stores them in the figure cache.
+# Returns the count of figures the shared backend did not take
+def warm_up(names, workers=None):
+    failed = 0
+
+    for name in names:
+        start = time.perf_counter()
+        jobs = [(name, list(args)) for args in callback_inputs[name]]
+        missing = [(name, args) for name, args in jobs
+                   if figure_cache.shared.get(figure_cache.shared_key(call_key(name, args))) is None]
+
+        name_failed = 0
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for key, value in executor.map(render, missing, chunksize=64):
+                if not figure_cache.store(key, value):
+                    name_failed += 1
+
+        print(f"{name}: {len(missing)} of {len(jobs)} figures rendered in {time.perf_counter() - start:.1f} s"
+              + (f', {name_failed} not stored' if name_failed else ''))
+        failed += name_failed
+
+    return failed
+
+
+if __name__ == '__main__':
+    # Callback names as arguments, e.g. python warmup.py satis_bar hist (all of them by default)
+    names = sys.argv[1:] or list(callback_inputs)
+
+    # Only a shared cache outlives this command
+    if figure_cache.shared is None:
+        sys.exit('FIGURE_CACHE_URL is not set (redis://host:port/db or a directory)')
+
+    # Beyond its capacity the backend would evict the first figures while storing the last ones
+    jobs = sum(len(callback_inputs[name]) for name in names)
+    capacity = figure_cache.shared.capacity
+
+    if capacity is not None and jobs > capacity:
+        sys.exit(f'{jobs} figures do not fit in the shared cache ({capacity} entries), '
+                 f'raise FIGURE_CACHE_MAX_ENTRIES or warm fewer callbacks')
+
+    # An unreachable store takes nothing (its errors are misses for the app) : the figures would be lost
+    if not figure_cache.shared.ping():
+        sys.exit('the shared cache (FIGURE_CACHE_URL) cannot be reached')
+
+    failed = warm_up(names, workers=os.cpu_count())
+
+    if failed:
+        sys.exit(f'{failed} figures could not be stored in the shared cache')